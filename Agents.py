@@ -0,0 +1,173 @@
+import json
+import logging
+import random
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from BitBoard import BitBoard
+from GameConfig import GameConfig, GameSettings, get_settings
+from OpeningBook import OpeningBook
+from PositionEvaluator import choose_move
+from Solver import Solver, AI_LEVELS
+
+# ai_mode values: agents move inside the request that ends a human turn, or on the agent thread pool
+AI_MODES = ("sync", "background")
+
+
+class Agent:
+    """A player that chooses the moves of one colour.
+
+    Interactive agents (keyboard, HTTP) never choose a move themselves, the
+    game waits for their moves to be submitted. Every other agent is asked by
+    the game with choose, which must not change the position it is given.
+    """
+
+    interactive = False
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def choose(self, position: BitBoard, time_budget: float) -> int:
+        """Return the column (0-indexed) to play in a position that is not decided yet."""
+        raise NotImplementedError
+
+
+class HumanAgent(Agent):
+    """Moves come from the keyboard or from HTTP requests."""
+
+    interactive = True
+
+    def __init__(self):
+        super().__init__("human")
+
+
+class LevelAgent(Agent):
+    """Plays like the AI level of the same name, see PositionEvaluator.choose_move."""
+
+    def __init__(self, level: str, solver: Solver, opening_book: Optional[OpeningBook] = None,
+                 rng: Optional[random.Random] = None):
+        super().__init__(level)
+        self.solver = solver
+        self.opening_book = opening_book
+        self.rng = rng or random
+
+    def choose(self, position: BitBoard, time_budget: float) -> int:
+        decision = choose_move(position, self.name, self.solver, self.opening_book, time_budget, rng=self.rng)
+        if decision.source == "search":
+            logging.info("AI %s search move at column %d (depth %d, score %d, %d nodes)", self.name,
+                         decision.column + 1, decision.depth, decision.score, decision.nodes)
+        else:
+            logging.info("AI %s %s move at column %d", self.name, decision.source, decision.column + 1)
+        return decision.column
+
+
+class SearchAgent(Agent):
+    """Searches a fixed number of moves ahead without opening book, named depth-N."""
+
+    def __init__(self, depth: int, solver: Solver):
+        super().__init__(f"depth-{depth}")
+        self.depth = depth
+        self.solver = solver
+
+    def choose(self, position: BitBoard, time_budget: float) -> int:
+        return self.solver.search(position, self.depth, time_budget).column
+
+
+class MctsAgent(Agent):
+    """Monte Carlo tree search for the time budget, or for a fixed number of playouts (mcts-N).
+
+    The tree is allocated on the first move, max_nodes nodes large, and
+    reused on the following turns of the game. Rollouts run on `workers`
+    processes, or in the calling process with 0.
+    """
+
+    def __init__(self, playouts: Optional[int] = None, seed: Optional[int] = None,
+                 max_nodes: int = 200000, workers: int = 0):
+        super().__init__("mcts" if playouts is None else f"mcts-{playouts}")
+        self.playouts = playouts
+        self.seed = seed
+        self.max_nodes = max_nodes
+        self.workers = workers
+        # MonteCarlo.MctsSearch, imported with NumPy when the agent first moves
+        self.search = None
+
+    def choose(self, position: BitBoard, time_budget: float) -> int:
+        if self.search is None:
+            from MonteCarlo import MctsSearch
+            self.search = MctsSearch(position.columns, self.max_nodes, workers=self.workers, seed=self.seed)
+        result = self.search.search(position, time_budget if self.playouts is None else float("inf"), self.playouts)
+        logging.info("AI %s move at column %d (%d playouts, %d nodes)", self.name, result.column + 1,
+                     result.playouts, result.nodes)
+        return result.column
+
+
+class ExternalAgent(Agent):
+    """Asks another program for its moves over HTTP.
+
+    The position is POSTed as JSON {"moves": "DDC", "player": "yellow",
+    "time-budget": 1.0} and the answer must be JSON {"column": "E"}. If the
+    program fails or answers with an unplayable column a random move is played,
+    so a broken agent cannot stall the game. HTTP clients cannot choose external
+    agents, only the tournament sets them up.
+    """
+
+    def __init__(self, url: str, rng: Optional[random.Random] = None):
+        super().__init__(f"external:{url}")
+        self.url = url
+        self.rng = rng or random
+
+    def choose(self, position: BitBoard, time_budget: float) -> int:
+        body = json.dumps({
+            "moves": "".join(chr(column + 65) for column in position.history),
+            "player": "red" if position.player_to_move == BitBoard.RED else "yellow",
+            "time-budget": time_budget,
+        }).encode()
+        request = urllib.request.Request(self.url, body, {"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=time_budget + 5) as response:
+                column = ord(json.loads(response.read())["column"][0].upper()) - 65
+            if position.can_play(column):
+                return column
+            logging.warning("Agent %s chose unplayable column %d, playing a random move", self.url, column + 1)
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+            logging.warning("Agent %s failed: %s, playing a random move", self.url, e)
+        return self.rng.choice([column for column in range(position.columns) if position.can_play(column)])
+
+
+def make_agent(spec: str, solver: Solver, opening_book: Optional[OpeningBook] = None,
+               rng: Optional[random.Random] = None, settings: Optional[GameSettings] = None) -> Agent:
+    """Create an agent from its name: human, an AI level, depth-N, mcts, mcts-N or external:<url>.
+
+    MCTS agents take their tree size and workers from settings, by default from
+    the current snapshot.
+    """
+    if spec == "human":
+        return HumanAgent()
+    if spec in AI_LEVELS:
+        return LevelAgent(spec, solver, opening_book, rng)
+    if spec.startswith("depth-") and spec[len("depth-"):].isdigit() and int(spec[len("depth-"):]) > 0:
+        return SearchAgent(int(spec[len("depth-"):]), solver)
+    if spec == "mcts" or (spec.startswith("mcts-") and spec[len("mcts-"):].isdigit()
+                          and int(spec[len("mcts-"):]) > 0):
+        playouts = None if spec == "mcts" else int(spec[len("mcts-"):])
+        settings = settings or get_settings()
+        return MctsAgent(playouts, rng.getrandbits(32) if rng else None,
+                         settings.mcts_max_nodes, settings.mcts_workers)
+    if spec.startswith("external:http://") or spec.startswith("external:https://"):
+        return ExternalAgent(spec[len("external:"):], rng)
+    raise ValueError(f"Unknown agent '{spec}', use human, {', '.join(AI_LEVELS)}, depth-N, "
+                     f"mcts, mcts-N or external:<url>")
+
+
+_shared_pool: Optional[ThreadPoolExecutor] = None
+_shared_lock = threading.Lock()
+
+
+def get_agent_pool() -> ThreadPoolExecutor:
+    """Return the threads that play agent moves of all games with ai_mode background."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = ThreadPoolExecutor(max_workers=GameConfig.ai_workers, thread_name_prefix="agent")
+        return _shared_pool
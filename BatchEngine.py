@@ -0,0 +1,145 @@
+from typing import Optional, Sequence
+import numpy as np
+from BitBoard import BitBoard
+from WinningLines import get_winning_lines
+from GameModel import Player, GameState
+
+# plain ints of the Player and GameState values, as stored in the arrays
+EMPTY, RED, YELLOW = int(Player.EMPTY), int(Player.RED), int(Player.YELLOW)
+RUNNING, RED_WINS, YELLOW_WINS, DRAW = (int(GameState.RUNNING), int(GameState.RED_WINS),
+                                        int(GameState.YELLOW_WINS), int(GameState.DRAW))
+
+
+class BatchEngine:
+    """Many Connect Four games advanced in lockstep with NumPy.
+
+    The boards use the bit layout of BitBoard: stones[i, 0] holds the red and
+    stones[i, 1] the yellow stones of board i as one uint64 each, heights[i]
+    the number of stones per column. A vector of moves is applied to all boards
+    at once and connect stones in a line are found with the shifted masks of
+    WinningLines for all of them together. Player and state values match the
+    Player and GameState enums.
+    """
+
+    def __init__(self, count: int, rows: int = 6, columns: int = 7, connect: int = 4):
+        if columns * (rows + 1) > 64:
+            raise ValueError("board too large: a board must fit into 64 bits")
+        self.count = count
+        self.rows = rows
+        self.columns = columns
+        self.height = rows + 1
+        self.connect = connect
+        self.stones = np.zeros((count, 2), dtype=np.uint64)
+        self.heights = np.zeros((count, columns), dtype=np.int8)
+        self.moves = np.zeros(count, dtype=np.int16)
+        self.state = np.zeros(count, dtype=np.int8)
+        self._run_shifts = [[np.uint64(shift) for shift in shifts]
+                            for shifts in get_winning_lines(rows, columns, connect).run_shifts]
+        # bit index of every cell, ordered column by column from the bottom
+        self._cell_bits = np.array([column * self.height + row for column in range(columns) for row in range(rows)],
+                                   dtype=np.uint64)
+
+    def reset(self, indices=None):
+        """Clear all boards, or the boards selected by indices."""
+        indices = slice(None) if indices is None else indices
+        self.stones[indices] = 0
+        self.heights[indices] = 0
+        self.moves[indices] = 0
+        self.state[indices] = RUNNING
+
+    @property
+    def player_to_move(self) -> np.ndarray:
+        """RED or YELLOW for every board."""
+        return np.where(self.moves % 2 == 0, RED, YELLOW).astype(np.int8)
+
+    def legal_moves(self) -> np.ndarray:
+        """Boolean array (count, columns) of the columns that can be played on running boards."""
+        return (self.heights < self.rows) & (self.state == RUNNING)[:, None]
+
+    def random_moves(self, rng: np.random.Generator) -> np.ndarray:
+        """Pick a random legal column for every board, -1 for boards that are over."""
+        legal = self.legal_moves()
+        # the legal column with the largest random key is chosen
+        keys = np.where(legal, rng.random(legal.shape), -1.0)
+        columns = keys.argmax(axis=1)
+        return np.where(legal.any(axis=1), columns, -1)
+
+    def play(self, columns: Sequence[int]) -> np.ndarray:
+        """Drop a stone of the player to move on every board into the given column.
+
+        Boards with column -1 and boards that are over are left unchanged.
+        Returns the row of every stone, -1 where no stone was played.
+        Raises ValueError if a column is full or outside the board.
+        """
+        columns = np.asarray(columns, dtype=np.int64)
+        if columns.shape != (self.count,):
+            raise ValueError(f"expected {self.count} moves, got shape {columns.shape}")
+        if (columns >= self.columns).any():
+            raise ValueError("column outside the board")
+        rows = np.full(self.count, -1, dtype=np.int64)
+        active = np.nonzero((columns >= 0) & (self.state == RUNNING))[0]
+        if active.size == 0:
+            return rows
+        played = columns[active]
+        row = self.heights[active, played].astype(np.int64)
+        if (row >= self.rows).any():
+            raise ValueError("column full")
+        player = (self.moves[active] % 2).astype(np.int64)
+        bits = np.left_shift(np.uint64(1), (played * self.height + row).astype(np.uint64))
+        self.stones[active, player] |= bits
+        self.heights[active, played] += 1
+        self.moves[active] += 1
+        rows[active] = row
+
+        won = self._has_line(self.stones[active, player])
+        self.state[active[won]] = np.where(player[won] == 0, RED_WINS, YELLOW_WINS)
+        full = ~won & (self.moves[active] == self.rows * self.columns)
+        self.state[active[full]] = DRAW
+        return rows
+
+    def _has_line(self, stones: np.ndarray) -> np.ndarray:
+        won = np.zeros(stones.shape, dtype=bool)
+        for shifts in self._run_shifts:
+            runs = stones
+            for shift in shifts:
+                runs = runs & (runs >> shift)
+            won |= runs != 0
+        return won
+
+    def rollout(self, rng: np.random.Generator, max_moves: Optional[int] = None) -> np.ndarray:
+        """Play random moves on all running boards until they are over and return the states."""
+        for _ in range(self.rows * self.columns if max_moves is None else max_moves):
+            columns = self.random_moves(rng)
+            if (columns < 0).all():
+                break
+            self.play(columns)
+        return self.state
+
+    def cells(self, indices=None) -> np.ndarray:
+        """Return the boards (or those selected by indices) as int8 array (n, rows, columns) of players.
+
+        Row 0 is the bottom row, like BitBoard.from_grid expects it.
+        """
+        stones = self.stones if indices is None else self.stones[indices]
+        bits = (stones[:, :, None] >> self._cell_bits[None, None, :]) & np.uint64(1)
+        grid = (bits[:, 0] * RED + bits[:, 1] * YELLOW).astype(np.int8)
+        return grid.reshape(len(stones), self.columns, self.rows).transpose(0, 2, 1)
+
+    def set_position(self, index: int, position: BitBoard):
+        """Copy a BitBoard position of the same size into board index."""
+        if (position.rows, position.columns, position.connect) != (self.rows, self.columns, self.connect):
+            raise ValueError("position has a different board size or connect length")
+        red = position.stones(RED)
+        yellow = position.stones(YELLOW)
+        self.stones[index] = (red, yellow)
+        self.heights[index] = position.heights
+        self.moves[index] = position.moves
+        winner = position.winner()
+        if winner != EMPTY:
+            self.state[index] = RED_WINS if winner == RED else YELLOW_WINS
+        else:
+            self.state[index] = DRAW if position.is_full() else RUNNING
+
+    def position(self, index: int) -> BitBoard:
+        """Return board index as BitBoard, without move history."""
+        return BitBoard.from_grid(self.cells([index])[0].tolist(), self.connect)
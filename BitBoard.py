@@ -0,0 +1,203 @@
+from typing import List, Sequence
+from WinningLines import WinningLines, get_winning_lines
+
+
+class BitBoard:
+    """Compact Connect Four position stored as two bit masks.
+
+    Every column uses ``rows + 1`` bits, the extra bit on top is a sentinel that
+    stays empty so that shifted masks never wrap from one column into the next.
+    Bit ``column * (rows + 1) + row`` represents a cell, row 0 is the bottom row.
+
+    ``current`` holds the stones of the player to move, ``mask`` holds all stones.
+    Red always moves first, so the player to move follows from the move counter.
+
+    A game is won with ``connect`` stones in a line, four by default. Wins and
+    threats are found with the winning lines of the board size, see WinningLines.
+    """
+
+    __slots__ = ("rows", "columns", "height", "board_mask", "lines", "current", "mask", "heights", "moves",
+                 "history")
+
+    EMPTY = 0
+    RED = 1
+    YELLOW = 2
+
+    def __init__(self, rows: int = 6, columns: int = 7, connect: int = 4):
+        self.rows = rows
+        self.columns = columns
+        self.height = rows + 1
+        self.lines: WinningLines = get_winning_lines(rows, columns, connect)
+        self.board_mask = self.lines.board_mask
+        self.reset()
+
+    def reset(self):
+        """Remove all stones from the board."""
+        self.current = 0
+        self.mask = 0
+        self.heights: List[int] = [0] * self.columns
+        self.moves = 0
+        self.history: List[int] = []
+
+    def copy(self) -> "BitBoard":
+        """Return an independent copy of this position."""
+        other = BitBoard.__new__(BitBoard)
+        other.rows = self.rows
+        other.columns = self.columns
+        other.height = self.height
+        other.board_mask = self.board_mask
+        other.lines = self.lines
+        other.current = self.current
+        other.mask = self.mask
+        other.heights = self.heights[:]
+        other.moves = self.moves
+        other.history = self.history[:]
+        return other
+
+    @property
+    def connect(self) -> int:
+        """Number of stones in a line that win the game."""
+        return self.lines.connect
+
+    @classmethod
+    def from_grid(cls, grid: Sequence[Sequence[int]], connect: int = 4) -> "BitBoard":
+        """Build a position from cells indexed as grid[row][column], row 0 is the bottom row.
+
+        The order of the moves is unknown, so the history of the position is empty.
+        Raises ValueError for stones that float above an empty cell or stone counts
+        that cannot occur with red moving first.
+        """
+        rows = len(grid)
+        columns = len(grid[0]) if rows else 0
+        position = cls(rows, columns, connect)
+        red = yellow = 0
+        for column in range(columns):
+            for row in range(rows):
+                player = grid[row][column]
+                if player == cls.EMPTY:
+                    continue
+                if row > 0 and grid[row - 1][column] == cls.EMPTY:
+                    raise ValueError(f"stone at ({row}, {column}) has no stone below it")
+                bit = position._cell_bit(column, row)
+                position.mask |= bit
+                if player == cls.RED:
+                    red |= bit
+                elif player == cls.YELLOW:
+                    yellow |= bit
+                else:
+                    raise ValueError(f"unknown player {player} at ({row}, {column})")
+                position.heights[column] = row + 1
+        red_count, yellow_count = red.bit_count(), yellow.bit_count()
+        if red_count - yellow_count not in (0, 1):
+            raise ValueError(f"{red_count} red and {yellow_count} yellow stones are not a reachable position")
+        position.moves = red_count + yellow_count
+        position.current = red if position.player_to_move == cls.RED else yellow
+        return position
+
+    @property
+    def player_to_move(self) -> int:
+        return self.RED if self.moves % 2 == 0 else self.YELLOW
+
+    def _cell_bit(self, column: int, row: int) -> int:
+        return 1 << (column * self.height + row)
+
+    def can_play(self, column: int) -> bool:
+        """Check whether a stone can be dropped into the column."""
+        return 0 <= column < self.columns and self.heights[column] < self.rows
+
+    def play(self, column: int) -> int:
+        """Drop a stone of the player to move into the column and return its row.
+
+        The caller is responsible for checking ``can_play`` first.
+        """
+        row = self.heights[column]
+        self.current ^= self.mask
+        self.mask |= self._cell_bit(column, row)
+        self.heights[column] = row + 1
+        self.moves += 1
+        self.history.append(column)
+        return row
+
+    def undo(self) -> int:
+        """Take back the last move and return its column."""
+        column = self.history.pop()
+        row = self.heights[column] - 1
+        self.heights[column] = row
+        self.mask ^= self._cell_bit(column, row)
+        self.current ^= self.mask
+        self.moves -= 1
+        return column
+
+    def stones(self, player: int) -> int:
+        """Return the bit mask of all stones of the given player."""
+        if player == self.player_to_move:
+            return self.current
+        return self.current ^ self.mask
+
+    def cell(self, row: int, column: int) -> int:
+        """Return the player occupying a cell, EMPTY if there is no stone."""
+        if not (0 <= row < self.rows and 0 <= column < self.columns):
+            raise IndexError(f"cell ({row}, {column}) is outside the board")
+        bit = self._cell_bit(column, row)
+        if not self.mask & bit:
+            return self.EMPTY
+        if self.current & bit:
+            return self.player_to_move
+        return self.YELLOW if self.player_to_move == self.RED else self.RED
+
+    def is_winning_move(self, column: int) -> bool:
+        """Check whether playing the column wins for the player to move.
+
+        Only the lines through the cell the stone drops into are inspected.
+        """
+        index = column * self.height + self.heights[column]
+        return self.lines.completes_line(self.current | 1 << index, index)
+
+    def last_move_wins(self) -> bool:
+        """Check whether the last stone completed a line.
+
+        Only the lines through the last stone are inspected, so the cost does not
+        depend on the board size.
+        """
+        if not self.history:
+            return False
+        column = self.history[-1]
+        return self.lines.completes_line(self.current ^ self.mask, column * self.height + self.heights[column] - 1)
+
+    def winner(self) -> int:
+        """Return the player who completed a line, EMPTY if nobody did."""
+        # only the player who moved last can have completed a line
+        won = self.last_move_wins() if self.history else self.lines.has_line(self.current ^ self.mask)
+        if won:
+            return self.YELLOW if self.player_to_move == self.RED else self.RED
+        return self.EMPTY
+
+    def is_full(self) -> bool:
+        """Check whether every cell is occupied."""
+        return self.moves == self.rows * self.columns
+
+    def playable_cells(self) -> int:
+        """Return the mask of the cells a stone would drop into, one per column that is not full."""
+        return sum(self._cell_bit(column, height) for column, height in enumerate(self.heights)
+                   if height < self.rows)
+
+    def winning_cells(self, stones: int) -> int:
+        """Return the mask of empty cells that would complete a line for the stones."""
+        return self.lines.winning_cells(stones, self.board_mask ^ self.mask)
+
+    def key(self) -> int:
+        """Return a number that uniquely identifies the position."""
+        return self.current + self.mask + self.lines.key_tag
+
+    def mirror_key(self, key: int) -> int:
+        """Return the key of the left-right mirrored position for a key of this board size.
+
+        Bits above the board, such as the key tag, stay as they are.
+        """
+        board_bits = self.columns * self.height
+        column_mask = (1 << self.height) - 1
+        mirrored = 0
+        for column in range(self.columns):
+            bits = (key >> (column * self.height)) & column_mask
+            mirrored |= bits << ((self.columns - 1 - column) * self.height)
+        return mirrored | (key >> board_bits << board_bits)
@@ -0,0 +1,87 @@
+import math
+import pygame
+from typing import Dict, Tuple
+from GameConfig import GameSettings
+from BitBoard import BitBoard
+
+
+class BoardRenderer:
+    """Draws board images from a pre-rendered template and one stone sprite per colour.
+
+    The template holds the background, labels and all empty cells. A frame is a
+    copy of the template, every stone is a single blit of a sprite onto its cell,
+    so adding a stone to a frame costs the same regardless of the board size.
+    Sizes, colours and the cell positions come from the settings it is created for.
+    """
+
+    def __init__(self, font: pygame.font.Font, settings: GameSettings):
+        self.font = font
+        self.settings = settings
+        self.width = settings.width
+        self.height = settings.height
+        self.radius = settings.radius
+        self.space = settings.space
+        # sprites are square with the stone in the middle and background colour around it
+        self.sprite_radius = math.ceil(self.radius) + 1
+        self.sprites: Dict[int, pygame.Surface] = {
+            BitBoard.EMPTY: self._render_sprite(settings.empty_color),
+            BitBoard.RED: self._render_sprite(settings.red_color),
+            BitBoard.YELLOW: self._render_sprite(settings.yellow_color),
+        }
+        self.template = self._render_template()
+
+    def _render_sprite(self, color) -> pygame.Surface:
+        size = 2 * self.sprite_radius
+        sprite = pygame.Surface((size, size))
+        sprite.fill(self.settings.bg_color)
+        pygame.draw.circle(sprite, color, (self.sprite_radius, self.sprite_radius), self.radius)
+        return sprite
+
+    def cell_center(self, column: int, row: int) -> Tuple[int, int]:
+        """Pixel center of a cell, row 0 is the bottom row."""
+        return self.settings.cell_centers[column][row]
+
+    def _render_text(self, surface: pygame.Surface, text: str, pos_x: float, pos_y: float):
+        rendered_text = self.font.render(text, True, self.settings.text_color, self.settings.bg_color)
+        surface.blit(rendered_text, rendered_text.get_rect(center=(pos_x, pos_y)))
+
+    def _render_template(self) -> pygame.Surface:
+        template = pygame.Surface((self.width, self.height))
+        template.fill("black")
+
+        settings = self.settings
+        border = settings.border_size
+        rect = pygame.Rect(border, border, self.width - 2*border, self.height - 2*border)
+        pygame.draw.rect(template, settings.bg_color, rect)
+
+        for column in range(settings.num_columns):
+            for row in range(settings.num_rows):
+                self.draw_stone(template, BitBoard.EMPTY, column, row)
+
+        for i in range(settings.num_rows):
+            y = 10 + 2*border + settings.font_size + i*2*(self.radius + self.space)
+            self._render_text(template, str(settings.num_rows - i), settings.font_size//2, y)
+
+        for i in range(settings.num_columns):
+            x = (i+1) * 2 * (self.radius + self.space) - 4*self.space
+            self._render_text(template, chr(i + 65), x, self.height - border)
+        return template
+
+    def new_frame(self) -> pygame.Surface:
+        """Return a fresh copy of the empty board."""
+        return self.template.copy()
+
+    def draw_stone(self, surface: pygame.Surface, player: int, column: int, row: int):
+        """Blit the sprite of the player onto a cell."""
+        x, y = self.cell_center(column, row)
+        surface.blit(self.sprites[player], (x - self.sprite_radius, y - self.sprite_radius))
+
+    def render_board(self, position: BitBoard) -> pygame.Surface:
+        """Return a new frame showing all stones of a position."""
+        frame = self.new_frame()
+        for row in range(position.rows):
+            for column in range(position.columns):
+                player = position.cell(row, column)
+                if player != BitBoard.EMPTY:
+                    self.draw_stone(frame, player, column, row)
+        return frame
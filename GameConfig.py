@@ -1,5 +1,13 @@
 import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field, fields
 from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+Color = Tuple[int, int, int]
 
 class GameConfig:
     # Default configuration
@@ -14,24 +22,56 @@ class GameConfig:
         "base_url": "http://localhost:8000",
         "num_columns": 7,
         "num_rows": 6,
+        "connect_length": 4,
         "width": 800,
         "height": 720,
-        "font": "freesansbold.ttf"
+        "font": "freesansbold.ttf",
+        "ai_level": "blocker",
+        "ai_time_budget": 1.0,
+        "ai_mode": "sync",
+        "ai_workers": 4,
+        "mcts_max_nodes": 200000,
+        "mcts_workers": 0,
+        "opening_book": "opening_book.bin",
+        "headless": False,
+        "screenshot_mode": "sync",
+        "screenshot_workers": 2,
+        "screenshot_wait": 2.0,
+        "screenshot_cache_bytes": 33554432,
+        "max_sessions": 1000,
+        "session_ttl": 1800,
+        "http_server": "threaded",
+        "http_workers": 64,
+        "http_keepalive_timeout": 5,
+        "move_log_flush_interval": 0.5,
+        "move_log_fsync": "never",
+        "move_log_max_open": 256,
+        "storage": "jsonl",
+        "database": "games.db",
+        "opening_length": 4,
+        "evaluation_cache_size": 10000,
+        "log_file": "four-wins.log",
+        "log_level": "INFO",
+        "log_format": "text",
+        "log_queue": True,
+        "config_reload_interval": 1.0
     }
     
     @classmethod
     def load(cls, config_file='game_config.json'):
-        """Load configuration from JSON file"""
+        """Load configuration from JSON file, raise ValueError if a setting is invalid"""
         config_path = Path(config_file)
         
         if config_path.exists():
             try:
                 with open(config_path, 'r') as f:
                     loaded_config = json.load(f)
-                # Update class attributes with loaded values
+                # Update class attributes with loaded values, other keys must not replace methods
                 for key, value in loaded_config.items():
-                    if hasattr(cls, key) or key in cls._defaults:
+                    if key in cls._defaults:
                         setattr(cls, key, value)
+                    else:
+                        print(f"Unknown config setting '{key}' ignored")
             except (json.JSONDecodeError, IOError) as e:
                 print(f"Error loading config: {e}, using defaults")
         else:
@@ -42,6 +82,9 @@ class GameConfig:
         for key, value in cls._defaults.items():
             if not hasattr(cls, key):
                 setattr(cls, key, value)
+
+        # fail at startup instead of in the middle of a game
+        GameSettings.from_config()
     
 
     @classmethod
@@ -56,3 +99,223 @@ class GameConfig:
                 json.dump(config, f, indent=2)
         except IOError as e:
             print(f"Error saving config: {e}")
+
+
+def _choices() -> Dict[str, Tuple[str, ...]]:
+    # imported here, these modules read GameConfig themselves
+    from Agents import AI_MODES
+    from GameLogging import LOG_FORMATS, LOG_LEVELS
+    from GameStore import STORAGE_MODES
+    from MoveLog import FSYNC_POLICIES
+    from PooledHTTPServer import HTTP_SERVERS
+    from ScreenshotWriter import SCREENSHOT_MODES
+    from Solver import AI_LEVELS
+    return {
+        "ai_level": AI_LEVELS,
+        "ai_mode": AI_MODES,
+        "screenshot_mode": SCREENSHOT_MODES,
+        "http_server": HTTP_SERVERS,
+        "move_log_fsync": FSYNC_POLICIES,
+        "storage": STORAGE_MODES,
+        "log_level": LOG_LEVELS,
+        "log_format": LOG_FORMATS,
+    }
+
+
+# smallest and largest (None for no limit) value of numeric settings
+_LIMITS = {
+    "border_size": (0, None),
+    "font_size": (1, None),
+    # columns are named by the letters A to Z
+    "num_columns": (1, 26),
+    # position keys hold rows and connect length in 8 bits each
+    "num_rows": (1, 255),
+    "connect_length": (2, 255),
+    "width": (1, None),
+    "height": (1, None),
+    "ai_time_budget": (0.001, None),
+    "ai_workers": (1, None),
+    "mcts_max_nodes": (2, None),
+    "mcts_workers": (0, None),
+    "screenshot_workers": (1, None),
+    "screenshot_wait": (0, None),
+    "screenshot_cache_bytes": (0, None),
+    "max_sessions": (1, None),
+    "session_ttl": (0.001, None),
+    "http_workers": (1, None),
+    "http_keepalive_timeout": (0.001, None),
+    "move_log_flush_interval": (0, None),
+    "move_log_max_open": (1, None),
+    "opening_length": (0, None),
+    "evaluation_cache_size": (0, None),
+    "config_reload_interval": (0, None),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class GameSettings:
+    """Validated, immutable snapshot of the configuration.
+
+    A game takes the current snapshot (see get_settings) when it starts and
+    keeps it until it ends, so a reloaded configuration only applies to new
+    games. The board size, connect length, AI level and time budget, base URL
+    and drawing settings are read per game; servers, pools, storage and logging
+    are set up once from GameConfig and change on restart. The board geometry used for
+    drawing is derived once per snapshot.
+    """
+
+    border_size: int
+    font_size: int
+    text_color: Color
+    bg_color: Color
+    yellow_color: Color
+    red_color: Color
+    empty_color: Color
+    base_url: str
+    num_columns: int
+    num_rows: int
+    connect_length: int
+    width: int
+    height: int
+    font: str
+    ai_level: str
+    ai_time_budget: float
+    ai_mode: str
+    ai_workers: int
+    mcts_max_nodes: int
+    mcts_workers: int
+    opening_book: str
+    headless: bool
+    screenshot_mode: str
+    screenshot_workers: int
+    screenshot_wait: float
+    screenshot_cache_bytes: int
+    max_sessions: int
+    session_ttl: float
+    http_server: str
+    http_workers: int
+    http_keepalive_timeout: float
+    move_log_flush_interval: float
+    move_log_fsync: str
+    move_log_max_open: int
+    storage: str
+    database: str
+    opening_length: int
+    evaluation_cache_size: int
+    log_file: str
+    log_level: str
+    log_format: str
+    log_queue: bool
+    config_reload_interval: float
+    # derived geometry: stone radius, gap between stones and the pixel centre of
+    # every cell as cell_centers[column][row], row 0 at the bottom
+    radius: float = field(init=False, compare=False)
+    space: float = field(init=False, compare=False)
+    cell_centers: Tuple[Tuple[Tuple[int, int], ...], ...] = field(init=False, compare=False, repr=False)
+
+    def __post_init__(self):
+        radius = (self.height - 3 * self.border_size) / (self.num_rows + 1) / 2
+        space = radius / 8
+        object.__setattr__(self, "radius", radius)
+        object.__setattr__(self, "space", space)
+        object.__setattr__(self, "cell_centers", tuple(
+            tuple((round((column + 1) * 2 * (radius + space) - self.border_size),
+                   round((self.num_rows - row) * 2 * (radius + space) - self.border_size))
+                  for row in range(self.num_rows))
+            for column in range(self.num_columns)))
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> "GameSettings":
+        """Check configuration values and return them as settings, missing keys take their defaults.
+
+        Raises ValueError listing every invalid setting.
+        """
+        problems = []
+        settings = {}
+        for setting in fields(cls):
+            if not setting.init:
+                continue
+            key = setting.name
+            value = values.get(key, GameConfig._defaults[key])
+            if setting.type is Color:
+                if not (isinstance(value, (list, tuple)) and len(value) == 3
+                        and all(type(part) is int and 0 <= part <= 255 for part in value)):
+                    problems.append(f"{key} must be a list of three values from 0 to 255, not {value!r}")
+                    continue
+                value = tuple(value)
+            elif setting.type is float:
+                if type(value) not in (int, float):
+                    problems.append(f"{key} must be a number, not {value!r}")
+                    continue
+                value = float(value)
+            elif type(value) is not setting.type:
+                problems.append(f"{key} must be of type {setting.type.__name__}, not {value!r}")
+                continue
+            settings[key] = value
+
+        for key, (low, high) in _LIMITS.items():
+            value = settings.get(key)
+            if value is not None and (value < low or (high is not None and value > high)):
+                limit = f"at least {low}" if high is None else f"from {low} to {high}"
+                problems.append(f"{key} must be {limit}, not {value!r}")
+        for key, choices in _choices().items():
+            value = settings.get(key)
+            if value is not None and (value.upper() if key == "log_level" else value) not in choices:
+                problems.append(f"{key} must be one of {', '.join(choices)}, not {value!r}")
+        if not problems and settings["height"] <= 3 * settings["border_size"]:
+            problems.append("height must be more than three times border_size")
+        if not problems and settings["connect_length"] > max(settings["num_rows"], settings["num_columns"]):
+            problems.append("connect_length must fit into num_rows or num_columns, no line could be completed")
+
+        if problems:
+            raise ValueError("Invalid configuration: " + "; ".join(problems))
+        return cls(**settings)
+
+    @classmethod
+    def from_config(cls) -> "GameSettings":
+        """Return a snapshot of the current GameConfig values."""
+        return cls.from_dict({key: getattr(GameConfig, key, default) for key, default in GameConfig._defaults.items()})
+
+
+_shared_settings: Optional[GameSettings] = None
+# (modification time, size) of the configuration file the settings were read from
+_shared_file: Optional[Tuple[int, int]] = None
+_next_check = 0.0
+_shared_lock = threading.Lock()
+
+
+def _file_version(config_file: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(config_file)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_settings(config_file: str = 'game_config.json') -> GameSettings:
+    """Return the current settings snapshot, reloaded when the configuration file changed.
+
+    The first snapshot is taken from GameConfig. After that the file is checked
+    at most every config_reload_interval seconds (0 never checks); a changed
+    file becomes the new snapshot, an invalid one is logged and ignored.
+    GameConfig itself keeps the values the process was started with.
+    """
+    global _shared_settings, _shared_file, _next_check
+    with _shared_lock:
+        now = time.monotonic()
+        if _shared_settings is None:
+            _shared_settings = GameSettings.from_config()
+            _shared_file = _file_version(config_file)
+            _next_check = now + _shared_settings.config_reload_interval
+        elif _shared_settings.config_reload_interval > 0 and now >= _next_check:
+            _next_check = now + _shared_settings.config_reload_interval
+            version = _file_version(config_file)
+            if version is not None and version != _shared_file:
+                _shared_file = version
+                try:
+                    with open(config_file, 'r') as f:
+                        _shared_settings = GameSettings.from_dict(json.load(f))
+                    logging.info("Configuration %s reloaded, new games use it", config_file)
+                except (OSError, ValueError) as e:
+                    logging.error("Configuration %s not reloaded: %s", config_file, e)
+        return _shared_settings
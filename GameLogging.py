@@ -0,0 +1,78 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from typing import Optional
+from GameConfig import GameConfig
+
+LOG_FORMATS = ("text", "json")
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# attributes of every log record, all others were passed with extra= and become fields of JSON records
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line.
+
+    Every object has time (UTC, ISO 8601), level, logger and message, followed
+    by the fields passed with extra=, e.g. game_id and turn of a move, and the
+    traceback of an exception if there is one.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records without formatting them, the listener thread does all the work.
+
+    QueueHandler.prepare renders the message on the calling thread so that a
+    record can be pickled; records handed to a thread need no copy. The
+    arguments of a message must therefore not change after the logging call,
+    which holds for the numbers and strings the game logs.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(filename: Optional[str] = None) -> Optional[logging.handlers.QueueListener]:
+    """Send the log records of the root logger to a file, configured by GameConfig.
+
+    log_level drops records below it before their message is formatted,
+    log_format selects "text" lines or "json" records. With log_queue the
+    records are queued and formatted and written by a listener thread, which
+    is returned and stopped at interpreter exit.
+    """
+    # log_level and log_format were checked by GameConfig.load
+    level = logging.getLevelName(GameConfig.log_level.upper())
+    handler = logging.FileHandler(filename or GameConfig.log_file, encoding="utf-8")
+    handler.setFormatter(JsonFormatter() if GameConfig.log_format == "json" else logging.Formatter(TEXT_FORMAT))
+    root = logging.getLogger()
+    root.setLevel(level)
+    if not GameConfig.log_queue:
+        root.addHandler(handler)
+        return None
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    root.addHandler(DeferredQueueHandler(records))
+    listener.start()
+    # write the records that are still queued before the interpreter exits
+    atexit.register(listener.stop)
+    return listener
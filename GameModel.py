@@ -0,0 +1,23 @@
+from enum import IntEnum
+from dataclasses import dataclass
+
+
+class Player(IntEnum):
+    EMPTY = 0
+    RED = 1
+    YELLOW = 2
+
+
+class GameState(IntEnum):
+    RUNNING = 0
+    RED_WINS = 1
+    YELLOW_WINS = 2
+    DRAW = 3
+
+
+@dataclass
+class GameMove:
+    player: Player
+    column: int
+    row: int
+    turn: int
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+
+class SessionLimitError(Exception):
+    """Raised when a new game would exceed the maximum number of live sessions."""
+
+
+class AmbiguousGameError(Exception):
+    """Raised when a game is looked up without id while several clients have live games."""
+
+
+@dataclass
+class GameSession:
+    game: Any
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    last_access: float = field(default_factory=time.monotonic)
+    # pinned sessions (e.g. the game shown in the window) are never evicted
+    pinned: bool = False
+
+    def touch(self):
+        self.last_access = time.monotonic()
+
+
+class GameRegistry:
+    """Live games of the HTTP server keyed by game id.
+
+    Every game has its own session with a lock, so requests for different games
+    do not block each other. Sessions idle for longer than ttl seconds are evicted
+    whenever a game is created or looked up.
+    """
+
+    def __init__(self, factory: Callable[..., Any], max_sessions: int = 1000, ttl: float = 1800):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: Dict[str, GameSession] = {}
+        self._creating = 0
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def add(self, game, pinned: bool = False) -> GameSession:
+        """Register an existing game under its current game id.
+
+        A game with its own lock attribute shares it with the session, so code that
+        changes the game outside of requests takes the same lock.
+        """
+        lock = getattr(game, "lock", None)
+        session = GameSession(game, pinned=pinned) if lock is None else GameSession(game, lock, pinned=pinned)
+        with self._lock:
+            self._sessions[game.game_id] = session
+        return session
+
+    def create(self, **options) -> GameSession:
+        """Start a new game in its own session, options are passed on to the factory.
+
+        Raises SessionLimitError if max_sessions games are alive after evicting idle ones.
+        """
+        self.evict_idle()
+        with self._lock:
+            if len(self._sessions) + self._creating >= self.max_sessions:
+                raise SessionLimitError(f"Too many live games (maximum {self.max_sessions})")
+            self._creating += 1
+        try:
+            game = self.factory(**options)
+            return self.add(game)
+        finally:
+            with self._lock:
+                self._creating -= 1
+
+    def get(self, game_id: Optional[str] = None) -> Optional[GameSession]:
+        """Return the session of a game or None if there is no such game.
+
+        Without game_id the only game that is not pinned is returned, or a pinned
+        game if there is none. Raises AmbiguousGameError if several games that are
+        not pinned are live, so that no client plays into the game of another one.
+        """
+        self._maybe_evict()
+        with self._lock:
+            if game_id is not None:
+                session = self._sessions.get(game_id)
+            else:
+                unpinned = [session for session in self._sessions.values() if not session.pinned]
+                if len(unpinned) > 1:
+                    raise AmbiguousGameError(f"{len(unpinned)} games are live, choose one with game-id")
+                pinned = [session for session in self._sessions.values() if session.pinned]
+                session = (unpinned or pinned or [None])[0]
+        if session is not None:
+            session.touch()
+        return session
+
+    def remove(self, game_id: str):
+        with self._lock:
+            session = self._sessions.pop(game_id, None)
+        if session is not None:
+            self._close(game_id, session)
+
+    def _maybe_evict(self):
+        # lookups are frequent, sweep at most once per second
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + 1.0
+            self.evict_idle()
+
+    def evict_idle(self) -> List[str]:
+        """Remove sessions that have not been used for ttl seconds and return their ids."""
+        deadline = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [(game_id, session) for game_id, session in self._sessions.items()
+                       if not session.pinned and session.last_access < deadline]
+            for game_id, _ in expired:
+                del self._sessions[game_id]
+        for game_id, session in expired:
+            self._close(game_id, session)
+        return [game_id for game_id, _ in expired]
+
+    def _close(self, game_id: str, session: GameSession):
+        close = getattr(session.game, "close", None)
+        if close is not None:
+            with session.lock:
+                close()
+        logging.info("Game session %s closed", game_id, extra={"game_id": game_id})
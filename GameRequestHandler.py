@@ -1,47 +1,248 @@
-import logging
-from http.server import BaseHTTPRequestHandler
+import contextlib
+import email.utils
+import os
+import re
+import time
 from urllib.parse import urlparse, parse_qs
 import json
+from GameConfig import get_settings
+from ScreenshotWriter import get_screenshot_writer
+from GameRegistry import AmbiguousGameError, SessionLimitError
+from MoveLog import get_move_log
+from GameStore import get_game_store
+from PositionEvaluator import parse_board, parse_moves
+from Metrics import get_metrics
+from PooledHTTPServer import PooledRequestHandler
 
-class GameRequestHandler(BaseHTTPRequestHandler):
+SCREENSHOT_PATH = re.compile(r'^/screens/([0-9a-f-]+)_turn(\d+)\.png$')
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# endpoint label of the request metrics, other paths are counted as "other"
+ENDPOINTS = ('/four-wins', '/evaluate', '/games', '/games/openings', '/metrics')
+# largest request body that is read and dropped to keep the connection open
+MAX_DISCARDED_BODY = 65536
+
+REQUEST_SECONDS = get_metrics().histogram("four_wins_http_request_seconds",
+                                          "Time from reading a request to the end of its response", ("endpoint",))
+REQUESTS = get_metrics().counter("four_wins_http_requests_total", "HTTP requests answered",
+                                 ("endpoint", "method", "status"))
+
+
+def endpoint_label(path):
+    """ Helper Method mapping a request path to one of a few endpoint labels """
+    path = urlparse(path).path
+    if path in ENDPOINTS:
+        return path
+    return '/screens' if path.startswith('/screens/') else 'other'
+
+class GameRequestHandler(PooledRequestHandler):
     game_instance = None
+    # live games by id, without a registry every request goes to game_instance
+    registry = None
+    # headers and body are separate writes, with Nagle's algorithm the body of a
+    # keep-alive response waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+    # status and start time of the request being handled, for the request metrics
+    response_status = None
+    request_start = None
+
+    def parse_request(self):
+        self.request_start = time.perf_counter()
+        self.response_status = None
+        return super().parse_request()
+
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+
+    def handle_one_request(self):
+        """ Handle one request and record its latency, waiting for the next request is not measured """
+        self.request_start = None
+        super().handle_one_request()
+        if self.request_start is not None and self.response_status is not None:
+            # a malformed request line is answered before the path is set
+            endpoint = endpoint_label(getattr(self, 'path', ''))
+            REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - self.request_start)
+            REQUESTS.labels(endpoint, self.command, self.response_status).inc()
+
+    def discard_body(self):
+        """ Helper Method reading and dropping the request body, the endpoints take their input from the query
+
+        Otherwise the body would be read as the next request of a keep-alive connection.
+        Bodies that cannot be skipped, chunked or too large ones, close the connection instead.
+        """
+        if self.headers.get('Transfer-Encoding'):
+            self.close_connection = True
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_DISCARDED_BODY:
+            self.close_connection = True
+            return
+        while length > 0:
+            chunk = self.rfile.read(min(length, 8192))
+            if not chunk:
+                self.close_connection = True
+                return
+            length -= len(chunk)
 
     def do_POST(self):
         """To start a new game, http POST is used, it returns the ID of the game"""
         parsed_url = urlparse(self.path)
-        
+        self.discard_body()
+
         if parsed_url.path == '/four-wins':    
-            game_id = self.game_instance.new_game()
+            # optional AI strength and agents of both colours,
+            # e.g. POST /four-wins?level=hard or /four-wins?red=hard&yellow=human
+            query_params = parse_qs(parsed_url.query)
+            level = query_params.get('level', [None])[0]
+            options = {'ai_level': level}
+            for color in ('red', 'yellow'):
+                options[color] = query_params.get(color, [None])[0]
+            options = {name: value for name, value in options.items() if value is not None}
+            if any(options.get(color, '').startswith('external:') for color in ('red', 'yellow')):
+                # the server would send every position to a URL chosen by the client
+                self.send_error(400, 'External agents cannot be chosen over HTTP')
+                return
+            try:
+                if self.registry is not None:
+                    game_id = self.registry.create(**options).game.game_id
+                else:
+                    # the game of connect_4_game has no lock
+                    with getattr(self.game_instance, 'lock', contextlib.nullcontext()):
+                        game_id = self.game_instance.new_game(**options)
+            except SessionLimitError as e:
+                self.send_error(503, str(e))
+                return
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
             try:
-                self.set_header(200, 'application/json')
-
-                self.end_headers()
                 response = {
                         'status': 'success',
                         'game-id': game_id
                     }
-                self.wfile.write(json.dumps(response).encode())
+                if level is not None:
+                    response['level'] = level
+                for color in ('red', 'yellow'):
+                    if color in options:
+                        response[color] = options[color]
+                self.send_json(200, response)
             except Exception as e:
                 self.send_error(500, str(e))
+        else:
+            self.send_error(404, 'Endpoint not found')
+
+    def get_game(self, query_params):
+        """ Helper Method returning the game selected by the game-id parameter and its lock
+
+        Without game-id the only live game is used, see GameRegistry.get; unknown games
+        raise a KeyError.
+        """
+        if self.registry is None:
+            return self.game_instance, contextlib.nullcontext()
+        game_id = query_params.get('game-id', [None])[0]
+        session = self.registry.get(game_id)
+        if session is None:
+            raise KeyError(f"Unknown game-id {game_id}")
+        return session.game, session.lock
 
-    def send_error(self, status, message):
+    def send_error(self, status, message=None, explain=None):
         """ Helper Method for sending error messages """
-        self.send_response(status)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        
         response = {
             'status': 'error',
             'message': message
         }
-        self.wfile.write(json.dumps(response).encode())
+        self.send_json(status, response)
+
+    def send_json(self, status, response):
+        """ Helper Method for sending a JSON response, the length is required for keep-alive connections """
+        body = json.dumps(response).encode()
+        self.set_header(status, 'application/json')
+        self.send_header('Content-Length', len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_file(self, path, content_type):
+        """ Helper Method streaming a file with sendfile, answering conditional and single range requests
+
+        ETag and Last-Modified are derived from the file's size and modification time, so a
+        growing move log gets a new ETag with every flush and clients can fetch only the
+        appended lines with Range: bytes=<known length>-
+        """
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            etag = f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+            last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+            if self.not_modified(etag, stat.st_mtime):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                return
+
+            size = stat.st_size
+            start, end = 0, size - 1
+            status = 200
+            byte_range = self.headers.get('Range')
+            if_range = self.headers.get('If-Range')
+            if byte_range is not None and (if_range is None or if_range == etag):
+                match = BYTE_RANGE.match(byte_range.strip())
+                if match and match.group(1):
+                    start = int(match.group(1))
+                    if match.group(2):
+                        end = min(int(match.group(2)), size - 1)
+                elif match and match.group(2):
+                    # suffix range, the last n bytes
+                    start = max(size - int(match.group(2)), 0)
+                if match and (match.group(1) or match.group(2)):
+                    if start >= size or start > end:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{size}')
+                        self.send_header('Content-Length', 0)
+                        self.end_headers()
+                        return
+                    status = 206
+
+            length = end - start + 1
+            self.set_header(status, content_type)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('Accept-Ranges', 'bytes')
+            if status == 206:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.send_header('Content-Length', length)
+            self.end_headers()
+            if length > 0:
+                # headers are written unbuffered, the body goes from the page cache to the socket
+                self.wfile.flush()
+                self.connection.sendfile(f, start, length)
+
+    def not_modified(self, etag, mtime):
+        """ Helper Method evaluating If-None-Match and If-Modified-Since """
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since is not None and since.tzinfo is not None:
+                return int(mtime) <= since.timestamp()
+        return False
 
     def set_header(self, status, content_type):
         """ Helper Method for sending positive responses """
         self.send_response(status)
         self.send_header('Content-type', content_type)
         self.send_header('Access-Control-Allow-Origin', '*')
+        if self.close_connection and self.protocol_version == 'HTTP/1.1':
+            # e.g. a request body that could not be skipped, the client must not send more requests
+            self.send_header('Connection', 'close')
 
     def do_GET(self):
         # Parse the URL and query parameters
@@ -52,25 +253,50 @@ class GameRequestHandler(BaseHTTPRequestHandler):
             # Currently the row is not evaluated, but it would be possible to return errors if the row does not match
             query_params = parse_qs(parsed_url.query)
             
-            if 'move' in query_params:
-                global my_game
+            if 'moves' in query_params:
+                # a whole sequence in one request, e.g. ?moves=DDCEF&screenshots=final
+                moves = query_params['moves'][0]
+                screenshots = query_params.get('screenshots', ['all'])[0]
+                try:
+                    game, lock = self.get_game(query_params)
+                except KeyError as e:
+                    self.send_error(404, e.args[0])
+                    return
+                except AmbiguousGameError as e:
+                    self.send_error(400, str(e))
+                    return
+                try:
+                    with lock:
+                        result = game.processHttpMoves(moves, screenshots)
+                    response = {'status': 'success', 'moves': moves}
+                    response.update(result)
+                    self.send_json(200, response)
+                except Exception as e:
+                    self.send_error(400, str(e))
+
+            elif 'move' in query_params:
                 move = query_params['move'][0]  # Get the first value
+                try:
+                    game, lock = self.get_game(query_params)
+                except KeyError as e:
+                    self.send_error(404, e.args[0])
+                    return
+                except AmbiguousGameError as e:
+                    self.send_error(400, str(e))
+                    return
                 
                 try:
-                    # Call your game function here
-                    # Replace 'make_move' with your actual method name
-                    result = self.game_instance.processHttpMove(move)
+                    # moves of one game are applied one at a time
+                    with lock:
+                        result = game.processHttpMove(move)
                     
                     # Send success response
-                    self.set_header(200, 'application/json')
-                    self.end_headers()
-                    
                     response = {
                         'status': 'success',
                         'move': move,
                         'result': result
                     }
-                    self.wfile.write(json.dumps(response).encode())
+                    self.send_json(200, response)
                     
                 except Exception as e:
                     # Send error response
@@ -83,18 +309,131 @@ class GameRequestHandler(BaseHTTPRequestHandler):
             # endpoint to retrieve the screenshots, as well as the game state as jsonl file
             try:                       
                 image_path = '.' + parsed_url.path
-                content_type = "text/jsonl+json" if parsed_url.path.endswith("jsonl") else "image/png"
-                with open(image_path,"rb") as img_file:
-                    file_data = img_file.read()
-                    file_data_len = len(file_data)        
-                    self.set_header(200, content_type)
-                    self.send_header("Content-Length",file_data_len) 
+                if '..' in parsed_url.path.split('/'):
+                    self.send_error(404, 'File not found')
+                    return
+                screenshot = SCREENSHOT_PATH.match(parsed_url.path)
+                if screenshot:
+                    game_id = screenshot.group(1)
+                else:
+                    game_id = os.path.basename(parsed_url.path).split('.')[0]
+                # files are written as set up by the game, finished games and the
+                # game of connect_4_game use the current settings
+                session = self.registry.get(game_id) if self.registry is not None else None
+                game = session.game if session is not None else self.game_instance
+                settings = getattr(game, 'settings', None) or get_settings()
+                if settings.screenshot_mode == "lazy" and screenshot and not os.path.exists(image_path):
+                    # render the requested turn from the move log instead of reading a file
+                    image = game.render_screenshot(screenshot.group(1), int(screenshot.group(2)))
+                    if image is None:
+                        self.send_error(404, 'Screenshot not found')
+                        return
+                    self.set_header(200, 'image/png')
+                    self.send_header("Content-Length", len(image))
                     self.end_headers()
-                    self.wfile.write(file_data)
-                
+                    self.wfile.write(image)
+                    return
+                if settings.screenshot_mode == "async" and not os.path.exists(image_path):
+                    # the screenshot may still be encoded in the background
+                    if not get_screenshot_writer().wait(image_path, settings.screenshot_wait):
+                        self.send_json(202, {'status': 'pending'})
+                        return
+                content_type = "text/jsonl+json" if parsed_url.path.endswith("jsonl") else "image/png"
+                if parsed_url.path.endswith("jsonl"):
+                    game_id = os.path.basename(parsed_url.path)[:-len(".jsonl")]
+                    if settings.storage == "sqlite" and get_game_store() is not None:
+                        # no log files are written, export the moves from the game store
+                        moves = get_game_store().load_moves(game_id)
+                        if not moves:
+                            self.send_error(404, 'Game not found')
+                            return
+                        file_data = "".join(json.dumps(move) + "\n" for move in moves).encode()
+                        self.set_header(200, content_type)
+                        self.send_header("Content-Length", len(file_data))
+                        self.end_headers()
+                        self.wfile.write(file_data)
+                        return
+                    # write moves that are still buffered before the log is read
+                    get_move_log().flush(game_id)
+                self.send_file(image_path, content_type)
+
+            except FileNotFoundError:
+                self.send_error(404, 'File not found')
             except Exception as e:
                 self.send_error(500, str(e))
         
+        elif parsed_url.path == '/evaluate':
+            # AI decision for any position without creating a game,
+            # e.g. /evaluate?moves=DDCE&level=hard or /evaluate?board=......./......./...
+            query_params = parse_qs(parsed_url.query)
+            settings = get_settings()
+            level = query_params.get('level', [settings.ai_level])[0]
+            try:
+                if 'board' in query_params:
+                    position = parse_board(query_params['board'][0], settings.num_rows, settings.num_columns,
+                                           settings.connect_length)
+                else:
+                    position = parse_moves(query_params.get('moves', [''])[0], settings.num_rows,
+                                           settings.num_columns, settings.connect_length)
+                decision = self.game_instance.evaluator.evaluate(position, level)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            except Exception as e:
+                self.send_error(500, str(e))
+                return
+            response = {
+                'status': 'success',
+                'level': level,
+                'player': 'red' if position.player_to_move == position.RED else 'yellow',
+                'column': chr(decision.column + 65),
+                'source': decision.source,
+                'score': decision.score,
+                'depth': decision.depth,
+                'nodes': decision.nodes,
+                'scores': {chr(column + 65): score for column, score in sorted(decision.scores.items())}
+            }
+            self.send_json(200, response)
+
+        elif parsed_url.path == '/metrics':
+            # Prometheus text format, scraped by the monitoring
+            body = get_metrics().render().encode()
+            self.set_header(200, 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif parsed_url.path in ('/games', '/games/openings'):
+            # queries over all recorded games, e.g. /games?status=red wins&opening=DD&level=hard
+            store = get_game_store()
+            if store is None:
+                self.send_error(404, 'Game store is disabled, set storage to sqlite or both')
+                return
+            query_params = parse_qs(parsed_url.query)
+            try:
+                if parsed_url.path == '/games/openings':
+                    length = int(query_params.get('length', ['2'])[0])
+                    response = {'status': 'success', 'openings': store.opening_stats(length)}
+                else:
+                    try:
+                        limit = int(query_params.get('limit', ['100'])[0])
+                    except ValueError:
+                        self.send_error(400, 'limit must be a number')
+                        return
+                    response = {
+                        'status': 'success',
+                        # SQLite reads a negative limit as no limit
+                        'games': store.query_games(status=query_params.get('status', [None])[0],
+                                                   opening=query_params.get('opening', [None])[0],
+                                                   ai_level=query_params.get('level', [None])[0],
+                                                   limit=max(1, min(limit, 1000)))
+                    }
+                self.send_json(200, response)
+            except ValueError as e:
+                self.send_error(400, str(e))
+            except Exception as e:
+                self.send_error(500, str(e))
+
         else:
             # Unknown endpoint
             self.send_error(404, 'Endpoint not found')
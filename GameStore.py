@@ -0,0 +1,193 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from GameConfig import GameConfig
+
+STORAGE_MODES = ("jsonl", "sqlite", "both")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    ai_level TEXT,
+    status TEXT NOT NULL,
+    moves INTEGER NOT NULL,
+    opening TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    num_rows INTEGER,
+    num_columns INTEGER,
+    connect_length INTEGER
+);
+CREATE TABLE IF NOT EXISTS moves (
+    game_id TEXT NOT NULL,
+    turn INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    move TEXT NOT NULL,
+    url TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (game_id, turn)
+);
+CREATE INDEX IF NOT EXISTS idx_games_status ON games (status);
+CREATE INDEX IF NOT EXISTS idx_games_opening ON games (opening);
+"""
+
+GAME_COLUMNS = ("game_id", "ai_level", "status", "moves", "opening", "started_at", "updated_at",
+                "num_rows", "num_columns", "connect_length")
+# columns added to the games table after its first version, with their types
+ADDED_GAME_COLUMNS = (("num_rows", "INTEGER"), ("num_columns", "INTEGER"), ("connect_length", "INTEGER"))
+
+
+class GameStore:
+    """SQLite database of all games and their moves.
+
+    The database runs in WAL mode so queries do not block the writer. Recorded
+    moves are queued and inserted in one transaction per batch by a background
+    thread every flush_interval seconds; with 0 every move is inserted when it
+    is recorded, as the move log does. Every query opens its own read-only
+    connection after flushing the queue. Recording a move only takes the lock
+    of the queue, the inserts run under a separate writer lock.
+    """
+
+    def __init__(self, path: str = "games.db", flush_interval: float = 0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._queue: List[Tuple] = []
+        # _lock guards _queue, _write_lock the connection and the order of batches
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        existing = {row[1] for row in self._connection.execute("PRAGMA table_info(games)")}
+        for column, column_type in ADDED_GAME_COLUMNS:
+            if column not in existing:
+                self._connection.execute(f"ALTER TABLE games ADD COLUMN {column} {column_type}")
+        self._stop = threading.Event()
+        self._thread = None
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._flush_loop, name="game-store", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def record_move(self, game_id: str, turn: int, player: str, move: str, url: str,
+                    status: str, opening: str, ai_level: Optional[str] = None,
+                    board: Tuple[Optional[int], Optional[int], Optional[int]] = (None, None, None)):
+        """Queue a move, the game row is updated with the status and opening of the move.
+
+        board is the (rows, columns, connect length) of the game.
+        """
+        with self._lock:
+            self._queue.append((game_id, turn, player, move, url, status, opening, ai_level, board, time.time()))
+        if self.flush_interval <= 0:
+            self.flush()
+
+    def flush(self):
+        """Insert all queued moves."""
+        with self._write_lock:
+            with self._lock:
+                queue, self._queue = self._queue, []
+            if not queue or self._connection is None:
+                return
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO moves (game_id, turn, player, move, url, status, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(game_id, turn, player, move, url, status, created)
+                     for game_id, turn, player, move, url, status, _, _, _, created in queue])
+                self._connection.executemany(
+                    "INSERT INTO games (game_id, ai_level, status, moves, opening, started_at, updated_at, "
+                    "num_rows, num_columns, connect_length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (game_id) DO UPDATE SET status = excluded.status, moves = excluded.moves, "
+                    "opening = excluded.opening, updated_at = excluded.updated_at",
+                    [(game_id, ai_level, status, turn, opening, created, created) + board
+                     for game_id, turn, _, _, _, status, opening, ai_level, board, created in queue])
+
+    def close(self):
+        """Insert the queued moves and close the database."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        with self._write_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        atexit.unregister(self.close)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logging.error("Writing to game store %s failed: %s", self.path, e)
+
+    def _read(self, sql: str, parameters: Tuple = ()) -> List[sqlite3.Row]:
+        self.flush()
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            connection.row_factory = sqlite3.Row
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    def query_games(self, status: Optional[str] = None, opening: Optional[str] = None,
+                    ai_level: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Return the most recent games, optionally filtered by status, opening prefix and AI level."""
+        conditions = []
+        parameters = []
+        if status is not None:
+            conditions.append("status = ?")
+            parameters.append(status)
+        if opening:
+            # prefix match as a range, so the opening index can be used
+            conditions.append("opening >= ? AND opening < ?")
+            parameters += [opening, opening[:-1] + chr(ord(opening[-1]) + 1)]
+        if ai_level is not None:
+            conditions.append("ai_level = ?")
+            parameters.append(ai_level)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = self._read(f"SELECT {', '.join(GAME_COLUMNS)} FROM games {where}"
+                          f"ORDER BY updated_at DESC LIMIT ?", tuple(parameters) + (limit,))
+        return [dict(row) for row in rows]
+
+    def opening_stats(self, length: int = 2) -> List[Dict]:
+        """Return the number of games and results per opening of the given number of moves."""
+        rows = self._read(
+            "SELECT substr(opening, 1, ?) AS opening, count(*) AS games, "
+            "sum(status = 'red wins') AS red_wins, sum(status = 'yellow wins') AS yellow_wins, "
+            "sum(status = 'draw') AS draws FROM games WHERE length(opening) >= ? "
+            "GROUP BY 1 ORDER BY games DESC", (length, length))
+        return [dict(row) for row in rows]
+
+    def load_moves(self, game_id: str) -> List[Dict]:
+        """Return the moves of a game in the JSONL record format.
+
+        The board size is left out for games recorded before it was stored.
+        """
+        rows = self._read("SELECT game_id, turn, player, move, url, moves.status AS status, num_rows AS rows, "
+                          "num_columns AS columns, connect_length AS connect FROM moves "
+                          "LEFT JOIN games USING (game_id) WHERE game_id = ? ORDER BY turn", (game_id,))
+        return [{key: value for key, value in dict(row).items()
+                 if value is not None or key not in ("rows", "columns", "connect")} for row in rows]
+
+
+_shared_store: Optional[GameStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_game_store() -> Optional[GameStore]:
+    """Return the store shared by all games of this process, None if GameConfig.storage has no SQLite."""
+    global _shared_store
+    if GameConfig.storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage '{GameConfig.storage}', choose one of {', '.join(STORAGE_MODES)}")
+    if GameConfig.storage == "jsonl":
+        return None
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = GameStore(GameConfig.database, GameConfig.move_log_flush_interval)
+        return _shared_store
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+from GameConfig import GameConfig
+from Metrics import register_cache
+
+
+class ImageCache:
+    """Thread-safe LRU cache of encoded images, bounded by the total size in bytes.
+
+    The least recently used images are evicted once the sum of all cached
+    images exceeds max_bytes. Images larger than max_bytes are not cached.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._images: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            data = self._images.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: Hashable, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._images[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.size = 0
+
+
+_shared_cache: Optional[ImageCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """Return the cache shared by all games of this process."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ImageCache(GameConfig.screenshot_cache_bytes)
+            register_cache("image", _shared_cache)
+        return _shared_cache
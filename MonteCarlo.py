@@ -0,0 +1,302 @@
+import atexit
+import math
+import multiprocessing
+import random
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from BatchEngine import BatchEngine, DRAW, RED_WINS, YELLOW_WINS
+from BitBoard import BitBoard
+
+# terminal marks of a node, for the player who made the move into it
+OPEN = 0
+WIN = 1
+TIE = 2
+
+
+@dataclass
+class MctsResult:
+    column: int
+    # playouts through each root column and the share of them won by the player to move
+    visits: Dict[int, int] = field(default_factory=dict)
+    win_rates: Dict[int, float] = field(default_factory=dict)
+    playouts: int = 0
+    nodes: int = 0
+
+
+def rollout_values(rows: int, columns: int, connect: int, stones: np.ndarray, heights: np.ndarray,
+                   moves: np.ndarray, repeat: int, seed: int) -> np.ndarray:
+    """Play repeat random games from every undecided position with the NumPy batch engine.
+
+    Returns the average result for the player who moved last: 1 for a win, 0.5
+    for a draw and 0 for a loss.
+    """
+    engine = BatchEngine(len(moves) * repeat, rows, columns, connect)
+    engine.stones[:] = np.repeat(stones, repeat, axis=0)
+    engine.heights[:] = np.repeat(heights, repeat, axis=0)
+    engine.moves[:] = np.repeat(moves, repeat)
+    states = engine.rollout(np.random.default_rng(seed)).reshape(len(moves), repeat)
+    red_moved_last = (moves % 2 == 1)[:, None]
+    won = np.where(red_moved_last, states == RED_WINS, states == YELLOW_WINS)
+    return (won + 0.5 * (states == DRAW)).mean(axis=1)
+
+
+def python_rollout_values(positions: Sequence[BitBoard], repeat: int, rng: random.Random) -> List[float]:
+    """Same as rollout_values for boards that do not fit into 64 bits, one game at a time."""
+    values = []
+    for start in positions:
+        total = 0.0
+        for _ in range(repeat):
+            position = start.copy()
+            mover = position.moves % 2
+            while True:
+                column = rng.choice([column for column in range(position.columns) if position.can_play(column)])
+                position.play(column)
+                if position.last_move_wins():
+                    total += 1.0 if (position.moves - 1) % 2 == mover else 0.0
+                    break
+                if position.is_full():
+                    total += 0.5
+                    break
+        values.append(total / repeat)
+    return values
+
+
+class MctsTree:
+    """Search tree stored in preallocated typed arrays instead of node objects.
+
+    Node n has parent[n], visits[n], value[n] (summed results for the player who
+    made the move into n), terminal[n] and its child for column c at
+    children[n * columns + c], -1 if it is not expanded. Memory is fixed by
+    max_nodes; when the arrays are full the subtree of the root is compacted
+    into them and expansion stops if that does not free space.
+    """
+
+    def __init__(self, columns: int, max_nodes: int):
+        self.columns = columns
+        self.max_nodes = max_nodes
+        self.children = array("i", [-1]) * (max_nodes * columns)
+        self.parent = array("i", [-1]) * max_nodes
+        self.visits = array("i", [0]) * max_nodes
+        self.value = array("d", [0.0]) * max_nodes
+        self.terminal = array("b", [OPEN]) * max_nodes
+        self.size = 0
+        self.root = 0
+        # moves from the empty board to the root, used to reuse the tree on the next turn
+        self.root_moves: Optional[List[int]] = []
+        self.reset([])
+
+    @property
+    def full(self) -> bool:
+        return self.size >= self.max_nodes
+
+    def new_node(self, parent: int) -> int:
+        node = self.size
+        self.size += 1
+        self.parent[node] = parent
+        self.visits[node] = 0
+        self.value[node] = 0.0
+        self.terminal[node] = OPEN
+        base = node * self.columns
+        self.children[base:base + self.columns] = array("i", [-1]) * self.columns
+        return node
+
+    def reset(self, moves: Optional[List[int]]):
+        """Start a new tree for the position after moves, None if they are unknown."""
+        self.size = 0
+        self.root = self.new_node(-1)
+        self.root_moves = None if moves is None else list(moves)
+
+    def advance(self, moves: List[int]) -> bool:
+        """Move the root to the position after moves, keeping the searched subtree if possible."""
+        if self.root_moves is None or moves[:len(self.root_moves)] != self.root_moves:
+            self.reset(moves)
+            return False
+        node = self.root
+        for column in moves[len(self.root_moves):]:
+            node = self.children[node * self.columns + column]
+            if node == -1:
+                self.reset(moves)
+                return False
+        self.root = node
+        self.root_moves = list(moves)
+        if self.full:
+            self.compact()
+        return True
+
+    def compact(self):
+        """Copy the subtree of the root to the front of the arrays, dropping all other nodes."""
+        columns = self.columns
+        order = [self.root]
+        for node in order:
+            base = node * columns
+            order.extend(child for child in self.children[base:base + columns] if child != -1)
+        index = {node: new for new, node in enumerate(order)}
+        children = array("i", [-1]) * (len(order) * columns)
+        for new, node in enumerate(order):
+            base = node * columns
+            for column in range(columns):
+                child = self.children[base + column]
+                if child != -1:
+                    children[new * columns + column] = index[child]
+        self.parent[:len(order)] = array("i", [-1] + [index[self.parent[node]] for node in order[1:]])
+        self.visits[:len(order)] = array("i", [self.visits[node] for node in order])
+        self.value[:len(order)] = array("d", [self.value[node] for node in order])
+        self.terminal[:len(order)] = array("b", [self.terminal[node] for node in order])
+        self.children[:len(children)] = children
+        self.size = len(order)
+        self.root = 0
+
+
+class MctsSearch:
+    """Monte Carlo tree search with UCT selection.
+
+    Every iteration selects batch_size leaves, counting a visit on the way down
+    so that the leaves of one batch spread over the tree, and scores each leaf by
+    rollouts random games. The rollouts of a batch are played by the NumPy batch
+    engine, split over the rollout worker processes if there are any. The tree is
+    kept between searches and reused when the next position follows from the
+    previous one, e.g. on the next turn of the same game.
+    """
+
+    def __init__(self, columns: int, max_nodes: int = 200000, exploration: float = 1.4,
+                 batch_size: int = 32, rollouts: int = 4, workers: int = 0, seed: Optional[int] = None):
+        self.tree = MctsTree(columns, max_nodes)
+        self.exploration = exploration
+        self.batch_size = batch_size
+        self.rollouts = rollouts
+        self.workers = workers
+        self.rng = random.Random(seed)
+
+    def search(self, position: BitBoard, time_budget: float, max_playouts: Optional[int] = None) -> MctsResult:
+        """Search until the time budget (seconds) or the number of playouts is used up."""
+        playable = [column for column in range(position.columns) if position.can_play(column)]
+        if not playable:
+            raise ValueError("no legal move in this position")
+        for column in playable:
+            if position.is_winning_move(column):
+                return MctsResult(column, playouts=0, nodes=self.tree.size)
+        if position.history or position.moves == 0:
+            self.tree.advance(position.history)
+        else:
+            # a position without move history cannot be matched with the tree
+            self.tree.reset(None)
+
+        deadline = time.perf_counter() + time_budget
+        playouts = 0
+        while time.perf_counter() < deadline and (max_playouts is None or playouts < max_playouts):
+            batch = self.batch_size if max_playouts is None else min(self.batch_size, max_playouts - playouts)
+            leaves = []
+            for _ in range(batch):
+                path, leaf, value = self._select(position)
+                if value is None:
+                    leaves.append((path, leaf))
+                else:
+                    self._backpropagate(path, value)
+            if leaves:
+                for (path, _), value in zip(leaves, self._evaluate([leaf for _, leaf in leaves])):
+                    self._backpropagate(path, value)
+            playouts += batch
+
+        tree = self.tree
+        base = tree.root * tree.columns
+        visits, win_rates = {}, {}
+        for column in playable:
+            child = tree.children[base + column]
+            if child != -1 and tree.visits[child] > 0:
+                visits[column] = tree.visits[child]
+                win_rates[column] = tree.value[child] / tree.visits[child]
+        column = max(visits, key=visits.get) if visits else self.rng.choice(playable)
+        return MctsResult(column, visits, win_rates, playouts, tree.size)
+
+    def _select(self, root_position: BitBoard):
+        """Walk down by UCT and expand one node, return (path, leaf position, value or None)."""
+        tree = self.tree
+        columns = tree.columns
+        position = root_position.copy()
+        node = tree.root
+        tree.visits[node] += 1
+        path = [node]
+        while True:
+            mark = tree.terminal[node]
+            if mark != OPEN:
+                return path, position, 1.0 if mark == WIN else 0.5
+            base = node * columns
+            untried = [column for column in range(columns)
+                       if tree.children[base + column] == -1 and position.can_play(column)]
+            if untried and not tree.full:
+                column = untried[self.rng.randrange(len(untried))]
+                child = tree.new_node(node)
+                tree.children[base + column] = child
+                won = position.is_winning_move(column)
+                position.play(column)
+                tree.visits[child] += 1
+                path.append(child)
+                if won:
+                    tree.terminal[child] = WIN
+                    return path, position, 1.0
+                if position.is_full():
+                    tree.terminal[child] = TIE
+                    return path, position, 0.5
+                return path, position, None
+
+            # every move is expanded, or there is no room for more nodes
+            log_visits = math.log(tree.visits[node])
+            best, best_column, best_score = -1, -1, -1.0
+            for column in range(columns):
+                child = tree.children[base + column]
+                if child == -1:
+                    continue
+                visits = tree.visits[child]
+                score = tree.value[child] / visits + self.exploration * math.sqrt(log_visits / visits)
+                if score > best_score:
+                    best, best_score = child, score
+                    best_column = column
+            if best == -1:
+                return path, position, None
+            position.play(best_column)
+            node = best
+            tree.visits[node] += 1
+            path.append(node)
+
+    def _backpropagate(self, path: List[int], value: float):
+        # visits were counted during selection, value is for the player who moved into the leaf
+        tree = self.tree
+        for node in reversed(path):
+            tree.value[node] += value
+            value = 1.0 - value
+
+    def _evaluate(self, positions: List[BitBoard]) -> List[float]:
+        first = positions[0]
+        if first.columns * (first.rows + 1) > 64:
+            return python_rollout_values(positions, self.rollouts, self.rng)
+        stones = np.array([(position.stones(BitBoard.RED), position.stones(BitBoard.YELLOW))
+                           for position in positions], dtype=np.uint64)
+        heights = np.array([position.heights for position in positions], dtype=np.int8)
+        moves = np.array([position.moves for position in positions], dtype=np.int16)
+        args = (first.rows, first.columns, first.connect)
+        if self.workers <= 0 or len(positions) < 2:
+            return rollout_values(*args, stones, heights, moves, self.rollouts, self.rng.getrandbits(32)).tolist()
+        pool = get_rollout_pool(self.workers)
+        chunks = np.array_split(np.arange(len(positions)), min(self.workers, len(positions)))
+        futures = [pool.submit(rollout_values, *args, stones[chunk], heights[chunk], moves[chunk],
+                               self.rollouts, self.rng.getrandbits(32)) for chunk in chunks]
+        return np.concatenate([future.result() for future in futures]).tolist()
+
+
+_shared_pool: Optional[ProcessPoolExecutor] = None
+_shared_lock = threading.Lock()
+
+
+def get_rollout_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the rollout worker processes shared by all searches of this process."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_shared_pool.shutdown)
+        return _shared_pool
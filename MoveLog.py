@@ -0,0 +1,133 @@
+import atexit
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, TextIO
+from GameConfig import GameConfig
+
+FSYNC_POLICIES = ("never", "flush", "close")
+
+
+class MoveLog:
+    """Buffered writer for the per-game JSONL move logs in ./screens.
+
+    Appended lines are collected in memory and written by a background thread
+    every flush_interval seconds (0 writes every line immediately). Files of
+    active games stay open; at most max_open files are kept open, the least
+    recently written one is closed first and reopened when needed. fsync is
+    called after every flush, when a game is closed, or never.
+
+    Appending only takes the lock of the queue, the files are written under a
+    separate lock, so a game never waits for disk I/O of the flush thread.
+    """
+
+    def __init__(self, directory: str = "./screens", flush_interval: float = 0.5,
+                 fsync: str = "never", max_open: int = 256):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}', choose one of {', '.join(FSYNC_POLICIES)}")
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_open = max_open
+        self._pending: Dict[str, List[str]] = {}
+        self._files: "OrderedDict[str, TextIO]" = OrderedDict()
+        # _lock guards _pending, _write_lock the files and the order of writes
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._flush_loop, name="move-log", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def path(self, game_id: str) -> str:
+        return os.path.join(self.directory, f"{game_id}.jsonl")
+
+    def append(self, game_id: str, line: str):
+        """Queue one line (including the newline) for the log of a game."""
+        with self._lock:
+            self._pending.setdefault(game_id, []).append(line)
+        if self.flush_interval <= 0:
+            self.flush(game_id)
+
+    def flush(self, game_id: Optional[str] = None):
+        """Write the queued lines of one game, or of all games."""
+        with self._write_lock:
+            self._write_pending(game_id)
+
+    def close_game(self, game_id: str):
+        """Write the queued lines of a finished game and close its file."""
+        with self._write_lock:
+            self._write_pending(game_id)
+            f = self._files.pop(game_id, None)
+            if f is not None:
+                self._close_file(f, self.fsync != "never")
+
+    def close(self):
+        """Write everything, close all files and stop the flush thread."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        with self._write_lock:
+            self._write_pending()
+            while self._files:
+                _, f = self._files.popitem()
+                self._close_file(f, self.fsync != "never")
+        atexit.unregister(self.close)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                logging.error("Writing move logs failed: %s", e)
+
+    def _write_pending(self, game_id: Optional[str] = None):
+        # called with self._write_lock held, so lines are written in the order they were taken
+        with self._lock:
+            if game_id is None:
+                batches, self._pending = self._pending, {}
+            else:
+                lines = self._pending.pop(game_id, None)
+                batches = {game_id: lines} if lines else {}
+        for pending_id, lines in batches.items():
+            self._write(pending_id, lines)
+
+    def _write(self, game_id: str, lines: List[str]):
+        # called with self._write_lock held
+        f = self._files.get(game_id)
+        if f is None:
+            f = open(self.path(game_id), "a", encoding="utf-8")
+            self._files[game_id] = f
+            if len(self._files) > self.max_open:
+                _, oldest = self._files.popitem(last=False)
+                self._close_file(oldest, False)
+        else:
+            self._files.move_to_end(game_id)
+        f.write("".join(lines))
+        f.flush()
+        if self.fsync == "flush":
+            os.fsync(f.fileno())
+
+    def _close_file(self, f: TextIO, sync: bool):
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+        f.close()
+
+
+_shared_log: Optional[MoveLog] = None
+_shared_lock = threading.Lock()
+
+
+def get_move_log() -> MoveLog:
+    """Return the move log shared by all games of this process."""
+    global _shared_log
+    with _shared_lock:
+        if _shared_log is None:
+            _shared_log = MoveLog(flush_interval=GameConfig.move_log_flush_interval,
+                                  fsync=GameConfig.move_log_fsync,
+                                  max_open=GameConfig.move_log_max_open)
+        return _shared_log
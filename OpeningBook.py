@@ -0,0 +1,185 @@
+import argparse
+import logging
+import mmap
+import os
+import struct
+import time
+from multiprocessing import Pool
+from typing import List, Optional, Tuple
+from BitBoard import BitBoard
+from Solver import Solver
+
+# File layout: a header followed by entries sorted by position key.
+# Only the canonical (smaller) key of a position and its mirror image is stored.
+HEADER = struct.Struct("<4sHHHI")  # magic, rows, columns, depth, entry count
+ENTRY = struct.Struct("<QhBx")     # key, score, best column
+MAGIC = b"C4BK"
+
+# solver of a generator worker process, created once per process by _init_worker
+_worker_solver: Optional[Solver] = None
+
+
+class OpeningBook:
+    """Read-only opening book backed by a memory-mapped file.
+
+    The file is opened on the first lookup, so creating the book is free. A
+    missing or unreadable file disables the book and every lookup returns None.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._loaded = False
+        self._file = None
+        self._data: Optional[mmap.mmap] = None
+        self.rows = 0
+        self.columns = 0
+        self.depth = 0
+        self.count = 0
+
+    def _load(self):
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            self._file = open(self.path, "rb")
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.rows, self.columns, self.depth, self.count = HEADER.unpack_from(self._data, 0)
+            if magic != MAGIC or len(self._data) < HEADER.size + self.count * ENTRY.size:
+                raise ValueError("not an opening book file")
+            logging.info("Opening book %s loaded: %d positions up to %d moves", self.path, self.count, self.depth)
+        except (OSError, ValueError, struct.error) as e:
+            logging.warning("Opening book %s disabled: %s", self.path, e)
+            self.close()
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _find(self, key: int) -> Optional[Tuple[int, int]]:
+        low, high = 0, self.count - 1
+        while low <= high:
+            middle = (low + high) // 2
+            entry_key, score, column = ENTRY.unpack_from(self._data, HEADER.size + middle * ENTRY.size)
+            if entry_key < key:
+                low = middle + 1
+            elif entry_key > key:
+                high = middle - 1
+            else:
+                return column, score
+        return None
+
+    def lookup(self, position: BitBoard) -> Optional[Tuple[int, int]]:
+        """Return (column, score) for the position or None if it is not in the book."""
+        if not self._loaded:
+            self._load()
+        # books are solved for connect four only
+        if (self._data is None or position.moves > self.depth or position.connect != 4
+                or position.rows != self.rows or position.columns != self.columns):
+            return None
+        key = _book_key(position)
+        mirrored = position.mirror_key(key)
+        if mirrored < key:
+            found = self._find(mirrored)
+            if found is None:
+                return None
+            column, score = found
+            return position.columns - 1 - column, score
+        return self._find(key)
+
+
+def enumerate_positions(rows: int, columns: int, depth: int) -> List[List[int]]:
+    """Return the move sequences of all distinct undecided positions with at most depth stones.
+
+    Mirror images are only listed once.
+    """
+    position = BitBoard(rows, columns)
+    seen = {_book_key(position)}
+    frontier = [[]]
+    sequences = [[]]
+    for _ in range(depth):
+        next_frontier = []
+        for moves in frontier:
+            position.reset()
+            for column in moves:
+                position.play(column)
+            for column in range(columns):
+                if not position.can_play(column) or position.is_winning_move(column):
+                    continue
+                position.play(column)
+                key = _book_key(position)
+                canonical = min(key, position.mirror_key(key))
+                if canonical not in seen and not position.is_full():
+                    seen.add(canonical)
+                    next_frontier.append(moves + [column])
+                position.undo()
+        sequences.extend(next_frontier)
+        frontier = next_frontier
+    return sequences
+
+
+def _book_key(position: BitBoard) -> int:
+    # books store 64-bit keys without the key tag, the header holds the board size
+    return position.key() - position.lines.key_tag
+
+
+def _init_worker():
+    global _worker_solver
+    _worker_solver = Solver()
+
+
+def _solve(args) -> Tuple[int, int, int]:
+    rows, columns, moves, search_depth, time_budget = args
+    position = BitBoard(rows, columns)
+    for column in moves:
+        position.play(column)
+    result = _worker_solver.search(position, search_depth, time_budget)
+    key = _book_key(position)
+    mirrored = position.mirror_key(key)
+    if mirrored < key:
+        return mirrored, result.score, columns - 1 - result.column
+    return key, result.score, result.column
+
+
+def generate(output: str, rows: int, columns: int, depth: int, search_depth: int,
+             time_budget: float, workers: int):
+    """Solve all positions up to depth stones and write them as a sorted book file."""
+    if columns * (rows + 1) > 64:
+        raise ValueError("board too large: position keys must fit into 64 bits")
+    started = time.perf_counter()
+    sequences = enumerate_positions(rows, columns, depth)
+    print(f"Solving {len(sequences)} positions up to {depth} moves with {workers} workers")
+
+    tasks = [(rows, columns, moves, search_depth, time_budget) for moves in sequences]
+    entries = []
+    with Pool(workers, initializer=_init_worker) as pool:
+        for i, entry in enumerate(pool.imap_unordered(_solve, tasks, chunksize=16), 1):
+            entries.append(entry)
+            if i % 1000 == 0:
+                print(f"{i}/{len(tasks)} positions solved")
+    entries.sort()
+
+    with open(output, "wb") as f:
+        f.write(HEADER.pack(MAGIC, rows, columns, depth, len(entries)))
+        for key, score, column in entries:
+            f.write(ENTRY.pack(key, score, column))
+    print(f"Wrote {len(entries)} positions to {output} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    from GameConfig import GameConfig
+    GameConfig.load()
+
+    parser = argparse.ArgumentParser(description="Precompute an opening book for the Connect Four AI")
+    parser.add_argument("--output", default=GameConfig.opening_book, help="book file to write")
+    parser.add_argument("--depth", type=int, default=8, help="number of stones up to which positions are stored")
+    parser.add_argument("--search-depth", type=int, default=16, help="search depth per position")
+    parser.add_argument("--time", type=float, default=2.0, help="search time per position in seconds")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args()
+
+    generate(args.output, GameConfig.num_rows, GameConfig.num_columns, args.depth,
+             args.search_depth, args.time, args.workers)
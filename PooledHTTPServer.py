@@ -0,0 +1,164 @@
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import List, Tuple
+
+# http_server values: a PooledHTTPServer with keep-alive, or the plain one request at a time HTTPServer
+HTTP_SERVERS = ("threaded", "single")
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that handles requests on a bounded pool of worker threads.
+
+    Unlike ThreadingHTTPServer no thread is started per connection. A worker
+    only takes a connection when a request has arrived on it: new and idle
+    keep-alive connections are watched by one selector thread, so clients that
+    keep their connection open between requests do not occupy workers. At most
+    `workers` requests are handled at once, further requests wait in the pool
+    queue. Idle connections are closed after `keepalive_timeout` seconds.
+
+    The handler must serve only the requests that have arrived and return while
+    the connection is idle, see PooledRequestHandler.
+    """
+
+    # pending connections the kernel queues before accept()
+    request_queue_size = 256
+
+    def __init__(self, server_address, handler_class, workers: int = 64, keepalive_timeout: float = 5.0):
+        # set up before binding, TCPServer calls server_close when binding fails
+        self.keepalive_timeout = keepalive_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        # connections handed back by workers, registered by the selector thread
+        self._parked: List[Tuple[socket.socket, object]] = []
+        self._parked_lock = threading.Lock()
+        self._closed = False
+        self._selector = selectors.DefaultSelector()
+        self._wakeup, self._wakeup_writer = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+        self._idle_thread = threading.Thread(target=self._watch_idle, name="http-idle", daemon=True)
+        self._idle_thread.start()
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        # a new connection waits for its first request like an idle one
+        self._park(request, client_address)
+
+    def _park(self, request, client_address):
+        with self._parked_lock:
+            if self._closed:
+                self.shutdown_request(request)
+                return
+            self._parked.append((request, client_address))
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wakeup_writer.send(b"\0")
+        except BlockingIOError:
+            # the selector thread has plenty of wakeups pending
+            pass
+
+    def _watch_idle(self):
+        selector = self._selector
+        next_expiry = float("inf")
+        while not self._closed:
+            timeout = None if next_expiry == float("inf") else max(0.0, next_expiry - time.monotonic())
+            try:
+                events = selector.select(timeout)
+            except OSError:
+                # the selector was closed by server_close
+                return
+            for key, _ in events:
+                if key.fileobj is self._wakeup:
+                    try:
+                        while self._wakeup.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                selector.unregister(key.fileobj)
+                try:
+                    self._executor.submit(self._process_request_thread, key.fileobj, key.data[0])
+                except RuntimeError:
+                    # the pool is shut down at interpreter exit
+                    self.shutdown_request(key.fileobj)
+                    return
+
+            now = time.monotonic()
+            with self._parked_lock:
+                parked, self._parked = self._parked, []
+            for request, client_address in parked:
+                selector.register(request, selectors.EVENT_READ, (client_address, now + self.keepalive_timeout))
+                next_expiry = min(next_expiry, now + self.keepalive_timeout)
+            if now >= next_expiry:
+                next_expiry = float("inf")
+                for key in list(selector.get_map().values()):
+                    if key.data is None:
+                        continue
+                    if key.data[1] <= now:
+                        selector.unregister(key.fileobj)
+                        self.shutdown_request(key.fileobj)
+                    else:
+                        next_expiry = min(next_expiry, key.data[1])
+
+    def _process_request_thread(self, request, client_address):
+        keep_alive = False
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+            keep_alive = not handler.close_connection
+        except Exception:
+            self.handle_error(request, client_address)
+        if keep_alive:
+            self._park(request, client_address)
+        else:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        with self._parked_lock:
+            self._closed = True
+            parked, self._parked = self._parked, []
+        self._wake()
+        self._idle_thread.join()
+        for key in list(self._selector.get_map().values()):
+            if key.fileobj is not self._wakeup:
+                self.shutdown_request(key.fileobj)
+        for request, _ in parked:
+            self.shutdown_request(request)
+        self._selector.close()
+        self._wakeup.close()
+        self._wakeup_writer.close()
+        self._executor.shutdown(wait=False)
+
+
+class PooledRequestHandler(BaseHTTPRequestHandler):
+    """Request handler that hands idle keep-alive connections back to a PooledHTTPServer.
+
+    It serves the requests that have arrived, including pipelined ones already
+    read into its buffer, and returns instead of waiting for the next request.
+    With any other server it serves the connection until it is closed.
+    """
+
+    def handle(self):
+        if not isinstance(self.server, PooledHTTPServer):
+            super().handle()
+            return
+        self.handle_one_request()
+        while not self.close_connection and self._request_waiting():
+            self.handle_one_request()
+
+    def _request_waiting(self) -> bool:
+        # the selector cannot see bytes that are already buffered by rfile, peek
+        # without blocking returns them or whatever the socket has received
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
@@ -0,0 +1,145 @@
+import random
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Dict, Optional, Tuple
+from BitBoard import BitBoard
+from OpeningBook import OpeningBook
+from Solver import Solver, TranspositionTable, AI_LEVELS, SEARCH_LEVELS
+
+# cell characters of the board encoding, rows from top to bottom separated by "/"
+BOARD_CELLS = {".": BitBoard.EMPTY, "R": BitBoard.RED, "Y": BitBoard.YELLOW}
+
+
+@dataclass
+class Decision:
+    """Column chosen by the AI for a position, scores are from the view of the player to move."""
+    column: int
+    # "book", "search", "block" or "random"
+    source: str
+    score: Optional[int] = None
+    depth: int = 0
+    nodes: int = 0
+    scores: Dict[int, int] = field(default_factory=dict)
+
+    def mirrored(self, columns: int) -> "Decision":
+        """Return the decision for the left-right mirrored position."""
+        return replace(self, column=columns - 1 - self.column,
+                       scores={columns - 1 - column: score for column, score in self.scores.items()})
+
+
+def parse_moves(moves: str, rows: int, columns: int, connect: int = 4) -> BitBoard:
+    """Build a position from column letters played in turn, e.g. "DDCE"."""
+    position = BitBoard(rows, columns, connect)
+    for index, letter in enumerate(moves):
+        column = ord(letter.upper()) - 65
+        if not position.can_play(column):
+            raise ValueError(f"Move {index + 1} '{letter}' is not playable")
+        if position.winner() != BitBoard.EMPTY:
+            raise ValueError(f"Move {index + 1} '{letter}' is played after the game is over")
+        position.play(column)
+    return position
+
+
+def parse_board(board: str, rows: int, columns: int, connect: int = 4) -> BitBoard:
+    """Build a position from rows of ".", "R" and "Y" from top to bottom separated by "/"."""
+    lines = board.upper().split("/")
+    if len(lines) != rows or any(len(line) != columns for line in lines):
+        raise ValueError(f"Board must have {rows} rows of {columns} cells separated by '/'")
+    try:
+        grid = [[BOARD_CELLS[cell] for cell in line] for line in reversed(lines)]
+    except KeyError as e:
+        raise ValueError(f"Unknown cell {e.args[0]!r}, use '.', 'R' or 'Y'") from None
+    return BitBoard.from_grid(grid, connect)
+
+
+def blocking_column(position: BitBoard) -> int:
+    """Return a column that stops the opponent from completing a line next move, -1 if none is needed."""
+    opponent = position.current ^ position.mask
+    threats = position.winning_cells(opponent) & position.playable_cells()
+    if not threats:
+        return -1
+    return (threats.bit_length() - 1) // position.height
+
+
+def choose_move(position: BitBoard, level: str, solver: Solver, opening_book: Optional[OpeningBook] = None,
+                time_budget: float = 1.0, exact_scores: bool = False, rng=random) -> Decision:
+    """Return the AI's move for a position that is not decided yet, without changing the position.
+
+    Search levels play from the opening book when it has the position and
+    search otherwise. The blocker level blocks a line the opponent could
+    complete next move, both simple levels play a random column otherwise.
+    """
+    if level not in AI_LEVELS:
+        raise ValueError(f"Unknown AI level '{level}', choose one of {', '.join(AI_LEVELS)}")
+    playable = [column for column in range(position.columns) if position.can_play(column)]
+    if not playable or position.winner() != BitBoard.EMPTY:
+        raise ValueError("Position is already decided")
+
+    if level in SEARCH_LEVELS:
+        book_move = opening_book.lookup(position) if opening_book is not None else None
+        if book_move is not None:
+            column, score = book_move
+            return Decision(column, "book", score, scores={column: score})
+        result = solver.search(position, SEARCH_LEVELS[level], time_budget, exact_scores)
+        return Decision(result.column, "search", result.score, result.depth, result.nodes, result.scores)
+
+    if level == "blocker":
+        column = blocking_column(position)
+        if column != -1:
+            return Decision(column, "block")
+    return Decision(rng.choice(playable), "random")
+
+
+class PositionEvaluator:
+    """Thread-safe front end of choose_move for arbitrary positions.
+
+    Decisions of search levels are computed with exact scores for every column
+    and kept in an LRU cache of at most cache_size entries, keyed by level and
+    the smaller of the position key and its mirror key, so a position and its
+    mirror image share one entry. Random moves are never cached.
+    """
+
+    def __init__(self, opening_book: Optional[OpeningBook] = None, table: Optional[TranspositionTable] = None,
+                 time_budget: float = 1.0, cache_size: int = 10000):
+        self.opening_book = opening_book
+        self.table = table if table is not None else TranspositionTable()
+        self.time_budget = time_budget
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[Tuple[str, int], Decision]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def evaluate(self, position: BitBoard, level: str) -> Decision:
+        key = position.key()
+        mirrored = position.mirror_key(key)
+        is_mirrored = mirrored < key
+        cache_key = (level, mirrored if is_mirrored else key)
+        with self._lock:
+            decision = self._cache.get(cache_key)
+            if decision is not None:
+                self._cache.move_to_end(cache_key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if decision is None:
+            # a solver per call, solvers are not thread-safe but can share the table
+            decision = choose_move(position, level, Solver(table=self.table), self.opening_book,
+                                   self.time_budget, exact_scores=True)
+            if decision.source == "random":
+                return decision
+            canonical = decision.mirrored(position.columns) if is_mirrored else decision
+            with self._lock:
+                self._cache[cache_key] = canonical
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return decision
+        return decision.mirrored(position.columns) if is_mirrored else decision
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
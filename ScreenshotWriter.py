@@ -0,0 +1,128 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Dict, Optional, Tuple
+from GameConfig import GameConfig, GameSettings
+from Metrics import get_metrics
+
+# screenshot_mode values: written on every move, encoded by worker processes, rendered
+# when requested from the move log, or not at all
+SCREENSHOT_MODES = ("sync", "async", "lazy", "none")
+
+# renderers of a worker process by the settings of the games they draw, created on first
+# use; the least recently used ones are dropped, every reloaded configuration adds one
+MAX_WORKER_RENDERERS = 8
+_worker_renderers: "OrderedDict[GameSettings, object]" = OrderedDict()
+
+
+def _init_worker():
+    import pygame
+    pygame.font.init()
+
+
+def _write_screenshot(filename: str, settings: GameSettings, moves: Tuple[int, ...]):
+    import pygame
+    from BitBoard import BitBoard
+    from BoardRenderer import BoardRenderer
+    renderer = _worker_renderers.get(settings)
+    if renderer is None:
+        renderer = BoardRenderer(pygame.font.Font(settings.font, settings.font_size), settings)
+        _worker_renderers[settings] = renderer
+        if len(_worker_renderers) > MAX_WORKER_RENDERERS:
+            _worker_renderers.popitem(last=False)
+    else:
+        _worker_renderers.move_to_end(settings)
+    position = BitBoard(settings.num_rows, settings.num_columns, settings.connect_length)
+    for column in moves:
+        position.play(column)
+    # write to a temporary name first so readers never see a half written file
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "wb") as f:
+        pygame.image.save(renderer.render_board(position), f, "png")
+    os.replace(temp_filename, filename)
+
+
+class ScreenshotWriter:
+    """Renders and encodes screenshots in worker processes.
+
+    PNG encoding holds the GIL, so it runs in separate processes. A job only
+    carries the settings of the game and the move sequence of the board, which
+    the worker replays and draws.
+    Jobs are tracked by file name until they are written, close() waits for all
+    of them and is registered to run at interpreter exit.
+    """
+
+    def __init__(self, workers: int = 2):
+        self._executor = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker)
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    def submit(self, filename: str, settings: GameSettings, moves: Tuple[int, ...]):
+        """Queue a screenshot of the board reached by the moves (column indexes)."""
+        filename = os.path.normpath(filename)
+        with self._lock:
+            future = self._executor.submit(_write_screenshot, filename, settings, tuple(moves))
+            self._pending[filename] = future
+        # runs right away if the job is already done
+        future.add_done_callback(lambda done: self._finished(filename, done))
+
+    def _finished(self, filename: str, future: Future):
+        with self._lock:
+            if self._pending.get(filename) is future:
+                del self._pending[filename]
+        if future.exception() is not None:
+            logging.error("Writing screenshot %s failed: %s", filename, future.exception())
+
+    def is_pending(self, filename: str) -> bool:
+        with self._lock:
+            return os.path.normpath(filename) in self._pending
+
+    def wait(self, filename: str, timeout: Optional[float] = None) -> bool:
+        """Wait until a queued screenshot is written, return False if it is still pending."""
+        with self._lock:
+            future = self._pending.get(os.path.normpath(filename))
+        if future is None:
+            return True
+        done, _ = wait([future], timeout=timeout)
+        return bool(done)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, timeout: Optional[float] = None):
+        """Wait until all queued screenshots are written."""
+        with self._lock:
+            futures = list(self._pending.values())
+        wait(futures, timeout=timeout)
+
+    def close(self):
+        """Write all queued screenshots and stop the worker processes."""
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown(wait=True)
+        atexit.unregister(self.close)
+
+
+_shared_writer: Optional[ScreenshotWriter] = None
+_shared_lock = threading.Lock()
+
+
+def get_screenshot_writer() -> ScreenshotWriter:
+    """Return the writer shared by all games of this process, starting it on first use."""
+    global _shared_writer
+    with _shared_lock:
+        if _shared_writer is None:
+            _shared_writer = ScreenshotWriter(GameConfig.screenshot_workers)
+            get_metrics().gauge("four_wins_screenshot_queue", "Screenshots queued or being written by the workers") \
+                .set_function(_shared_writer.pending_count)
+        return _shared_writer
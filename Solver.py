@@ -0,0 +1,202 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from BitBoard import BitBoard
+
+
+# Maximum search depth per AI strength level, the time budget from GameConfig caps every level
+SEARCH_LEVELS: Dict[str, int] = {
+    "easy": 2,
+    "medium": 5,
+    "hard": 10,
+    "perfect": 64,
+}
+
+# Levels that do not search: random moves and blocking of three in a row
+SIMPLE_LEVELS = ("random", "blocker")
+
+AI_LEVELS = SIMPLE_LEVELS + tuple(SEARCH_LEVELS)
+
+WIN_SCORE = 10000
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+@dataclass
+class SearchResult:
+    column: int
+    score: int
+    depth: int
+    nodes: int
+    scores: Dict[int, int] = field(default_factory=dict)
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget is exhausted."""
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results keyed by BitBoard.key().
+
+    Each slot holds one entry and a newer entry always replaces the older one,
+    so memory use is bounded by the size chosen at construction. Entries are
+    stored as single tuples, so one table can be shared by solvers on several threads.
+    """
+
+    def __init__(self, size: int = 1 << 20):
+        self.size = size
+        self.entries: List[Optional[Tuple[int, int, int, int, int]]] = [None] * size
+
+    def get(self, key: int) -> Optional[Tuple[int, int, int, int]]:
+        """Return (depth, flag, score, column) for the key or None."""
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry[1:]
+        return None
+
+    def put(self, key: int, depth: int, flag: int, score: int, column: int):
+        self.entries[key % self.size] = (key, depth, flag, score, column)
+
+    def clear(self):
+        self.entries = [None] * self.size
+
+
+class Solver:
+    """Negamax search with alpha-beta pruning and iterative deepening.
+
+    Scores are from the perspective of the player to move. A win is worth
+    WIN_SCORE minus the number of stones on the board when it is completed, so
+    faster wins score higher. Positions at the depth limit are scored by the
+    difference in cells that would complete a line for each player.
+    """
+
+    def __init__(self, table_size: int = 1 << 20, table: Optional[TranspositionTable] = None):
+        # a solver is used by one thread at a time, but several solvers can share a table
+        self.table = table if table is not None else TranspositionTable(table_size)
+        self.nodes = 0
+        self._deadline = 0.0
+        self._order: List[int] = []
+
+    def move_order(self, position: BitBoard) -> List[int]:
+        """Return the columns ordered from the center outwards."""
+        center = (position.columns - 1) / 2
+        return sorted(range(position.columns), key=lambda column: abs(column - center))
+
+    def search(self, position: BitBoard, max_depth: int, time_budget: float,
+               exact_scores: bool = False) -> SearchResult:
+        """Search the position until max_depth is reached or the time budget (seconds) runs out.
+
+        The result of the deepest completed iteration is returned. With exact_scores
+        every root column is searched with a full window, otherwise only the score
+        of the chosen column is exact and the others are upper bounds. Deepening
+        stops early once the chosen column wins or loses, with exact_scores only
+        once every column does, so the other columns do not keep scores of a
+        shallower search.
+        """
+        position = position.copy()
+        self._order = self.move_order(position)
+        playable = [column for column in self._order if position.can_play(column)]
+        if not playable:
+            raise ValueError("no legal move in this position")
+
+        self.nodes = 0
+        self._deadline = time.perf_counter() + time_budget
+        remaining = position.rows * position.columns - position.moves
+        result = SearchResult(playable[0], 0, 0, 0)
+
+        for depth in range(1, min(max_depth, remaining) + 1):
+            try:
+                scores = self._search_root(position, playable, depth, exact_scores)
+            except SearchTimeout:
+                break
+            best = max(playable, key=lambda column: scores[column])
+            result = SearchResult(best, scores[best], depth, self.nodes, scores)
+            # try the best column first in the next iteration
+            playable.remove(best)
+            playable.insert(0, best)
+            decided = playable if exact_scores else [best]
+            if all(abs(scores[column]) > WIN_SCORE - 100 for column in decided):
+                break
+
+        result.nodes = self.nodes
+        return result
+
+    def _search_root(self, position: BitBoard, playable: List[int], depth: int,
+                     exact_scores: bool) -> Dict[int, int]:
+        scores = {}
+        alpha = -WIN_SCORE
+        for column in playable:
+            if position.is_winning_move(column):
+                scores[column] = WIN_SCORE - position.moves - 1
+            else:
+                position.play(column)
+                window_alpha = -WIN_SCORE if exact_scores else alpha
+                scores[column] = -self._negamax(position, depth - 1, -WIN_SCORE, -window_alpha)
+                position.undo()
+            alpha = max(alpha, scores[column])
+        return scores
+
+    def _negamax(self, position: BitBoard, depth: int, alpha: int, beta: int) -> int:
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+
+        if position.is_full():
+            return 0
+        order = self._order[:]
+        for column in order:
+            if position.can_play(column) and position.is_winning_move(column):
+                return WIN_SCORE - position.moves - 1
+        if depth == 0:
+            return self.evaluate(position)
+
+        key = position.key()
+        best_column = -1
+        entry = self.table.get(key)
+        if entry is not None:
+            entry_depth, flag, score, best_column = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return score
+                if flag == LOWER_BOUND:
+                    alpha = max(alpha, score)
+                elif flag == UPPER_BOUND:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+            if best_column != -1:
+                order.remove(best_column)
+                order.insert(0, best_column)
+
+        alpha_start = alpha
+        best_score = -WIN_SCORE
+        for column in order:
+            if not position.can_play(column):
+                continue
+            position.play(column)
+            score = -self._negamax(position, depth - 1, -beta, -alpha)
+            position.undo()
+            if score > best_score:
+                best_score = score
+                best_column = column
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+
+        if best_score <= alpha_start:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.table.put(key, depth, flag, best_score, best_column)
+        return best_score
+
+    def evaluate(self, position: BitBoard) -> int:
+        """Heuristic score of a position for the player to move."""
+        own = position.winning_cells(position.current).bit_count()
+        other = position.winning_cells(position.current ^ position.mask).bit_count()
+        return own - other
@@ -0,0 +1,123 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class WinningLines:
+    """Every winning line of a board size and connect length, in the bit layout of BitBoard.
+
+    lines holds one mask of connect cells per line, cell_lines[bit] the masks of
+    the lines through a cell, so checking a move only looks at the lines through
+    its cell. Whole-board scans use shifted masks instead, one shift per
+    direction in directions, which costs a few operations per direction
+    whatever the board size. Tables are built once per board size and connect
+    length, see get_winning_lines.
+    """
+
+    def __init__(self, rows: int = 6, columns: int = 7, connect: int = 4):
+        if connect < 2:
+            raise ValueError(f"connect length must be at least 2, not {connect}")
+        if max(rows, columns, connect) > 255:
+            raise ValueError(f"board size and connect length must be at most 255, not {rows}x{columns} connect {connect}")
+        self.rows = rows
+        self.columns = columns
+        self.connect = connect
+        self.height = rows + 1
+        # bit distance to the next cell upwards, to the right and along both diagonals
+        self.directions = (1, self.height, self.height - 1, self.height + 1)
+        bottom = sum(1 << (column * self.height) for column in range(columns))
+        self.board_mask = bottom * ((1 << rows) - 1)
+        # added to position keys: a marker bit above rows, columns and connect, 8 bits
+        # each, above the board, so that positions of other board sizes or connect
+        # lengths never share transposition table or cache entries
+        self.key_tag = ((1 << 24) | rows << 16 | columns << 8 | connect) << (columns * self.height)
+        # shifts that double the length of runs of stones up to connect, per direction
+        steps = []
+        length = 1
+        while length < connect:
+            steps.append(min(length, connect - length))
+            length += steps[-1]
+        self.run_shifts = tuple(tuple(step * shift for step in steps) for shift in self.directions)
+        # shifts to the 1st up to the (connect - 1)th cell of a line, per direction
+        self._line_shifts = tuple(tuple(i * shift for i in range(1, connect)) for shift in self.directions)
+
+        lines: List[int] = []
+        cell_lines: List[List[int]] = [[] for _ in range(columns * self.height)]
+        for column_step, row_step in ((0, 1), (1, 0), (1, -1), (1, 1)):
+            for column in range(columns):
+                for row in range(rows):
+                    last_column = column + (connect - 1) * column_step
+                    last_row = row + (connect - 1) * row_step
+                    if not (last_column < columns and 0 <= last_row < rows):
+                        continue
+                    cells = [(column + i * column_step) * self.height + row + i * row_step for i in range(connect)]
+                    line = sum(1 << cell for cell in cells)
+                    lines.append(line)
+                    for cell in cells:
+                        cell_lines[cell].append(line)
+        self.lines: Tuple[int, ...] = tuple(lines)
+        self.cell_lines: Tuple[Tuple[int, ...], ...] = tuple(tuple(masks) for masks in cell_lines)
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def completes_line(self, stones: int, cell: int) -> bool:
+        """Check whether the stones fill one of the lines through the cell with the given bit index."""
+        for line in self.cell_lines[cell]:
+            if stones & line == line:
+                return True
+        return False
+
+    def has_line(self, stones: int) -> bool:
+        """Check a stone mask for connect stones in a line anywhere on the board.
+
+        A bit of runs marks the start of a run of stones, the run length doubles
+        with every step, so connect four takes two steps per direction. The empty
+        sentinel bit on top of every column stops runs from wrapping between columns.
+        """
+        for shifts in self.run_shifts:
+            runs = stones
+            for shift in shifts:
+                runs &= runs >> shift
+            if runs:
+                return True
+        return False
+
+    def winning_cells(self, stones: int, empty: int) -> int:
+        """Return the mask of the empty cells that would complete a line for the stones.
+
+        A cell completes a line when it has a stones directly before it and
+        connect - 1 - a stones directly after it in one direction. Vertically only
+        the cell on top of a column can be empty.
+        """
+        vertical, *others = self._line_shifts
+        cells = -1
+        for shift in vertical:
+            cells &= stones << shift
+        for shifts in others:
+            # before[a] marks the cells with a stones directly before them
+            before = [-1]
+            for shift in shifts:
+                before.append(before[-1] & (stones << shift))
+            cells |= before.pop()
+            # after marks the cells with as many stones directly after them as shifted so far
+            after = -1
+            for shift in shifts:
+                after &= stones >> shift
+                cells |= before.pop() & after
+        return cells & empty
+
+
+_shared_tables: Dict[Tuple[int, int, int], WinningLines] = {}
+_shared_lock = threading.Lock()
+
+
+def get_winning_lines(rows: int, columns: int, connect: int = 4) -> WinningLines:
+    """Return the winning lines of a board size and connect length, shared by all positions of this process."""
+    key = (rows, columns, connect)
+    table: Optional[WinningLines] = _shared_tables.get(key)
+    if table is None:
+        with _shared_lock:
+            table = _shared_tables.get(key)
+            if table is None:
+                table = _shared_tables[key] = WinningLines(rows, columns, connect)
+    return table
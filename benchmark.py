@@ -0,0 +1,275 @@
+"""Benchmarks of the game engine, the AI, rendering and the HTTP server.
+
+Every benchmark reports latency percentiles and throughput. Results are written
+as JSON and can be compared with an earlier run to catch regressions:
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --output current.json --compare baseline.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+from GameConfig import GameConfig, get_settings
+from GameModel import GameState
+from MoveLog import get_move_log
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of sorted samples with linear interpolation."""
+    if not samples:
+        return 0.0
+    index = (len(samples) - 1) * q / 100
+    lower = int(index)
+    upper = min(lower + 1, len(samples) - 1)
+    return samples[lower] + (samples[upper] - samples[lower]) * (index - lower)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Return count, throughput and latency statistics in milliseconds of samples in seconds."""
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        "count": len(samples),
+        "ops_per_sec": len(samples) / total if total > 0 else 0.0,
+        "mean_ms": total / len(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": samples[-1] * 1000 if samples else 0.0,
+    }
+
+
+def timed(function: Callable, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def use_screenshot_mode(mode: str):
+    """Write screenshot_mode into the scratch configuration and wait until new games take it.
+
+    Games play with the settings snapshot, which is reloaded from the file.
+    """
+    GameConfig.screenshot_mode = mode
+    GameConfig.save("game_config.json")
+    deadline = time.monotonic() + GameConfig.config_reload_interval + 5.0
+    while get_settings().screenshot_mode != mode:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"screenshot_mode '{mode}' was not reloaded from game_config.json")
+        time.sleep(0.01)
+
+
+def screenshot_files() -> List[str]:
+    return [name for name in os.listdir("screens") if name.endswith(".png")]
+
+
+def random_column(game, rng: random.Random) -> int:
+    return rng.choice([column for column in range(GameConfig.num_columns) if game.is_valid_move(column)])
+
+
+def bench_add_stone(game, games: int, rng: random.Random) -> List[float]:
+    """Time add_stone for whole games against the random AI, the reply of the AI is included."""
+    samples = []
+    for _ in range(games):
+        game.new_game(ai_level="random")
+        while game.state == GameState.RUNNING:
+            samples.append(timed(game.add_stone, random_column(game, rng) + 1))
+    return samples
+
+
+def bench_check_winner(game, games: int, rng: random.Random) -> List[float]:
+    """Time _check_winner after every move of random games."""
+    samples = []
+    for _ in range(games):
+        game.new_game(ai_level="random")
+        while game.state == GameState.RUNNING:
+            game._play(random_column(game, rng))
+            samples.append(timed(game._check_winner))
+    return samples
+
+
+def bench_ai_move(game, level: str, positions: int, rng: random.Random) -> List[float]:
+    """Time one agent move in positions after 0 to 11 random moves, yellow to move."""
+    samples = []
+    while len(samples) < positions:
+        game.new_game(ai_level=level)
+        for _ in range(rng.randrange(6) * 2 + 1):
+            if game.state != GameState.RUNNING:
+                break
+            game._play(random_column(game, rng))
+        if game.state == GameState.RUNNING:
+            samples.append(timed(game._play_agent_turn))
+    return samples
+
+
+def bench_render(game, frames: int, rng: random.Random) -> List[float]:
+    """Time render_stones plus a synchronous PNG screenshot of positions from random games."""
+    samples = []
+    game.new_game(ai_level="random")
+    for _ in range(frames):
+        if game.state != GameState.RUNNING:
+            game.new_game(ai_level="random")
+        game._play(random_column(game, rng))
+        start = time.perf_counter()
+        game.render_stones()
+        game._capture_screenshot(game.turn - 1)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_http(game, games: int, port: int, rng: random.Random) -> Dict[str, List[float]]:
+    """Play whole games against the random AI over a keep-alive connection to a local server."""
+    from connect_four_improved import start_http_server
+    from GameRequestHandler import GameRequestHandler
+    # the access log of every request would flood the benchmark output
+    GameRequestHandler.log_message = lambda handler, format, *args: None
+    server = start_http_server(game, port)
+    connection = http.client.HTTPConnection("localhost", port)
+    samples = {"http_move": [], "http_game": []}
+
+    def request(method: str, path: str) -> bytes:
+        connection.request(method, path)
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path} answered {response.status}: {body!r}")
+        return body
+
+    try:
+        for _ in range(games):
+            game_start = time.perf_counter()
+            game_id = json.loads(request("POST", "/four-wins?level=random"))["game-id"]
+            # the client only picks columns, the game state is read from the server process
+            session_game = GameRequestHandler.registry.get(game_id).game
+            while session_game.state == GameState.RUNNING:
+                column = chr(random_column(session_game, rng) + 65)
+                start = time.perf_counter()
+                request("GET", f"/four-wins?move={column}&game-id={game_id}")
+                samples["http_move"].append(time.perf_counter() - start)
+            samples["http_game"].append(time.perf_counter() - game_start)
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+    return samples
+
+
+def run(args) -> Dict:
+    from connect_four_improved import ConnectFour
+    rng = random.Random(args.seed)
+    use_screenshot_mode("none")
+    game = ConnectFour(headless=True)
+    results = {}
+
+    def record(name: str, samples: List[float]):
+        results[name] = summarize(samples)
+        print(f"{name}: p50 {results[name]['p50_ms']:.3f} ms, p99 {results[name]['p99_ms']:.3f} ms, "
+              f"{results[name]['ops_per_sec']:.1f} ops/s")
+
+    use_screenshot_mode("none")
+    record("add_stone", bench_add_stone(game, args.games, rng))
+    record("check_winner", bench_check_winner(game, args.games, rng))
+    for level in args.levels:
+        record(f"ai_move[{level}]", bench_ai_move(game, level, args.positions, rng))
+    if screenshot_files():
+        raise RuntimeError("screenshots were written with screenshot_mode 'none', the timings include them")
+    use_screenshot_mode("sync")
+    record("render_screenshot", bench_render(game, args.frames, rng))
+    use_screenshot_mode(args.http_screenshots)
+    for name, samples in bench_http(game, args.http_games, args.port, rng).items():
+        record(name, samples)
+
+    return {
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Print the change of p50 and p99 against a baseline and return the regressed benchmarks."""
+    regressions = []
+    print(f"{'benchmark':<22}{'p50 base':>12}{'p50 now':>12}{'change':>9}{'p99 base':>12}{'p99 now':>12}{'change':>9}")
+    for name, now in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<22}{'':>12}{now['p50_ms']:>12.3f}{'new':>9}")
+            continue
+        changes = []
+        for key in ("p50_ms", "p99_ms"):
+            changes.append(now[key] / base[key] - 1 if base[key] > 0 else 0.0)
+        print(f"{name:<22}{base['p50_ms']:>12.3f}{now['p50_ms']:>12.3f}{changes[0]:>+9.1%}"
+              f"{base['p99_ms']:>12.3f}{now['p99_ms']:>12.3f}{changes[1]:>+9.1%}")
+        if changes[0] > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the game engine, AI, rendering and HTTP server")
+    parser.add_argument("--output", default="benchmark.json", help="file for the JSON results")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative p50 slowdown reported as regression (default 0.10)")
+    parser.add_argument("--games", type=int, default=50, help="games for add_stone and check_winner")
+    parser.add_argument("--levels", nargs="+", default=["blocker", "easy", "medium"],
+                        help="AI levels to time")
+    parser.add_argument("--positions", type=int, default=30, help="positions per AI level")
+    parser.add_argument("--frames", type=int, default=100, help="rendered screenshots")
+    parser.add_argument("--http-games", type=int, default=20, help="games played over HTTP")
+    parser.add_argument("--http-screenshots", default="none", help="screenshot_mode of the HTTP games")
+    parser.add_argument("--port", type=int, default=8099, help="port of the local HTTP server")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    # the per-move log messages of the game are not part of the measurement
+    logging.basicConfig(level=logging.WARNING)
+
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    # screenshots and move logs go to a scratch directory, configured like the current one
+    GameConfig.load()
+    GameConfig.opening_book = os.path.abspath(GameConfig.opening_book)
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="four-wins-bench-")
+    try:
+        os.makedirs(os.path.join(scratch, "screens"))
+        # games are not retained between benchmark runs
+        GameConfig.storage = "jsonl"
+        # the screenshot mode of each phase is read from the file, see use_screenshot_mode
+        GameConfig.config_reload_interval = 0.01
+        GameConfig.save(os.path.join(scratch, "game_config.json"))
+        os.chdir(scratch)
+        current = run(args)
+        get_move_log().close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+    print(f"Results written to {output}")
+    if baseline is not None:
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions above {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,8 @@ from urllib.parse import urlparse, parse_qs
 import json
 from GameRequestHandler import GameRequestHandler 
 from GameConfig import GameConfig
+from MoveLog import get_move_log
+from GameLogging import setup_logging
 
 import logging
 import pygame
@@ -21,6 +23,7 @@ class ConnectFour:
     running = True
 
     game_id  = ""
+    draw = False
     reds_turn = True
     turn = 1
 
@@ -41,6 +44,9 @@ class ConnectFour:
         pygame.font.init()
         pygame.display.set_caption('Four wins - VLM edition')
 
+        #the result file is written by the buffered move log
+        self.move_log = get_move_log()
+
         self.radius = (self.screen.get_height()-3*GameConfig.border_size) / (GameConfig.num_rows+1) / 2
         self.space = self.radius / 8
         
@@ -54,11 +60,12 @@ class ConnectFour:
     def new_game(self):
         self.game_id = str(uuid.uuid4())
         logging.info(" ==========  New game has started ======== ")
-        logging.info(f"game-id = {self.game_id}")
+        logging.info("game-id = %s", self.game_id)
         self.game_result_file = f"./screens/{self.game_id}.jsonl"
-        reds_turn = True
-        turn = 1
-        running = True
+        self.draw = False
+        self.reds_turn = True
+        self.turn = 1
+        self.running = True
         for row in range(0, GameConfig.num_rows):
             new_row = []
             for column in range(0, GameConfig.num_columns):
@@ -115,42 +122,47 @@ class ConnectFour:
         filename = f"./screens/{self.game_id}_turn{self.turn}.png"
         pygame.image.save(self.screen,filename)  # Save the image to the disk
 
+    def random_column(self):
+        #counted from 1 like add_stone expects it, full columns cannot take another stone
+        return random.choice([column+1 for column in range(0, GameConfig.num_columns)
+                              if self.board[GameConfig.num_rows-1][column] == self.empty])
+
     def allow_random_bot_move(self):
-        column = random.randrange(1, 7)
+        column = self.random_column()
         self.add_stone(column)
 
     def allow_clever_bot_move(self, last_row, last_column):
         column = -1
         #prevent four in a column
         column = self.prevent_column(last_row,last_column)
-        logging.info(f"bot received column: {column} from column check")
+        logging.info("bot received column: %s from column check", column)
         if(column != -1):
-            logging.info(f"bot accepted column: {column}")
+            logging.info("bot accepted column: %s", column)
             self.add_stone(column)
             return
         else: #prevent for across
             column = self.prevent_cross(last_row,last_column)
-            logging.info(f"bot received column: {column} from cross check")
+            logging.info("bot received column: %s from cross check", column)
             if(column != -1):
-                logging.info(f"bot accepted column: {column}")
+                logging.info("bot accepted column: %s", column)
                 self.add_stone(column+1)
                 return
             else: #prevent four in a row
                 column = self.prevent_row(last_row,last_column)
-                logging.info(f"bot received column: {column} from row check")
+                logging.info("bot received column: %s from row check", column)
                 if(column != -1):
-                    logging.info(f"bot accepted column: {column}")
+                    logging.info("bot accepted column: %s", column)
                     self.add_stone(column)
                     return
         logging.info("random move")
-        column = random.randrange(1, GameConfig.num_columns)
+        column = self.random_column()
         self.add_stone(column)
 
     def prevent_row(self, last_row, last_column): 
-        logging.info(f"prevent row: last row: {last_row}, last column: {last_column}")
+        logging.info("prevent row: last row: %s, last column: %s", last_row, last_column)
         win_color = self.board[last_row][last_column]
         if win_color != self.red:
-            logging.warning(f"prevent row: last move not recorded correctly {chr(last_column+65)}{last_row+1}")     
+            logging.warning("prevent row: last move not recorded correctly %s%s", chr(last_column+65), last_row+1)     
             return -1
         row=last_row
         subsequent_hits = 1
@@ -160,76 +172,76 @@ class ConnectFour:
             try: 
                 current_color=self.board[row][column]
             except:
-                logging.info(f"exception at prevent row: {column}{row} = {chr(column+65)}{row+1}")
-            logging.info(f"prevent - checking row: {chr(column+65)}{row+1}")
+                logging.info("exception at prevent row: %s%s = %s%s", column, row, chr(column+65), row+1)
+            logging.info("prevent - checking row: %s%s", chr(column+65), row+1)
             if (current_color == self.red and current_color == win_color):
-                logging.info(f"subsequent stones in a row:  {subsequent_hits+1}")
+                logging.info("subsequent stones in a row:  %s", subsequent_hits+1)
                 subsequent_hits += 1
                 if subsequent_hits ==2:
                     try:
                         if self.board[row][column+1] == self.empty \
                                 and self.board[row][column-2] == self.empty:
                             if row == 0 or self.board[row-1][column-2] != self.empty:  # don't need to do something, if space below is empty
-                                logging.info(f"preventing row from {chr(column-1+65)}{row+1} to {chr(column+65)}{row+1}")
+                                logging.info("preventing row from %s%s to %s%s", chr(column-1+65), row+1, chr(column+65), row+1)
                                 return column-1
                     except:
                         logging.info("border at one side detected, nothing to worry about")
                 if subsequent_hits == 3:
                     try:
-                        logging.info(f"preventing four in a row at {chr(column+65)}{row+1}")
+                        logging.info("preventing four in a row at %s%s", chr(column+65), row+1)
                         if self.board[row][column+1] == self.empty:
-                            logging.info(f"next cell at {chr(column+1+65)}{row+1} is empty")
+                            logging.info("next cell at %s%s is empty", chr(column+1+65), row+1)
                             return column+2  # must be one addition plus because add_stone is from player perspective, who starts at 1
-                        logging.info(f"next cell at {chr(column+1+65)}{row+1} has stone of color {self.board[row][column+1]}")
+                        logging.info("next cell at %s%s has stone of color %s", chr(column+1+65), row+1, self.board[row][column+1])
                     except:
-                        logging.info(f"there is no cell after {chr(column+65)}{row+1}")
+                        logging.info("there is no cell after %s%s", chr(column+65), row+1)
                     try:
-                        logging.info(f"preventing four in a row at {chr(column-3+65)}{row+1}")
+                        logging.info("preventing four in a row at %s%s", chr(column-3+65), row+1)
                         if self.board[row][column-3] == self.empty:
-                            logging.info(f"cell before row at {chr(column-2+65)}{row+1} is empty")
+                            logging.info("cell before row at %s%s is empty", chr(column-2+65), row+1)
                             return column-2 # must be one addition plus because add_stone is from player perspective, who starts at 1
-                        logging.info(f"cell before row at {chr(column-2+65)}{row+1} has stone of color {self.board[row][column-3]}")
+                        logging.info("cell before row at %s%s has stone of color %s", chr(column-2+65), row+1, self.board[row][column-3])
                     except:
-                        logging.info(f"there is no cell before {chr(column-1+65)}{row+1}")
+                        logging.info("there is no cell before %s%s", chr(column-1+65), row+1)
             elif current_color != self.empty:
                 win_color = current_color
                 subsequent_hits = 1
         return -1
                 
     def prevent_column(self, last_row, last_column):  
-        logging.info(f"prevent column called for column {last_column}")
+        logging.info("prevent column called for column %s", last_column)
         win_color =self.board[last_row][last_column]
         if win_color != self.red:
-            logging.warning(f"last move not recorded correctly {chr(last_column+65)}{last_row+1}")     
+            logging.warning("last move not recorded correctly %s%s", chr(last_column+65), last_row+1)     
             return -1
         column = last_column  
         win_color = self.empty
         subsequent_hits = 1
         for row in range(0, GameConfig.num_rows):
             current_color = self.board[row][column]            
-            logging.info(f"prevent - checking column: {chr(column+65)}{row+1} with current color = {current_color} and win color = {win_color}")
+            logging.info("prevent - checking column: %s%s with current color = %s and win color = %s", chr(column+65), row+1, current_color, win_color)
             if current_color == self.red:
                 if current_color == win_color:
-                    logging.info(f"checking column {chr(column+65)}: susequent stones: {subsequent_hits+1}")
+                    logging.info("checking column %s: susequent stones: %s", chr(column+65), subsequent_hits+1)
                     subsequent_hits += 1
                     if subsequent_hits == 3:
-                        logging.info(f"preventing four in a column at {chr(column+65)}{row+1}")
+                        logging.info("preventing four in a column at %s%s", chr(column+65), row+1)
                         if self.board[row][column+1] == self.empty:
-                            logging.info(f"next cell at {chr(column+65)}{row+2} is empty")
+                            logging.info("next cell at %s%s is empty", chr(column+65), row+2)
                             return column+1
-                logging.info(f"new win colour is {current_color}")
+                logging.info("new win colour is %s", current_color)
                 win_color = current_color
             elif current_color == self.empty:
                 return -1
         return -1
     
     def prevent_cross(self, last_row, last_column):
-        logging.info(f"prevent cross called for column {last_column} and row {last_row}")
+        logging.info("prevent cross called for column %s and row %s", last_column, last_row)
         row = last_row
         column = last_column
         win_color = self.board[row][column]
         if win_color != self.red:
-            logging.warning(f"last move not recorded correctly {chr(column+65)}{row+1}")     
+            logging.warning("last move not recorded correctly %s%s", chr(column+65), row+1)     
             return -1
         #try right down
         try:
@@ -296,108 +308,47 @@ class ConnectFour:
         screenshot = f"/screens/{self.game_id}_turn{self.turn}.png"
         
         if(self.reds_turn):
-            logging.info(f"Turn {self.turn}: red player adds the next stone at {chr(column+65)}{row+1}")
-            self.check_game_over()
-            game_result = "running" if self.running==True  else "red wins"
-            with open(self.game_result_file, "a", encoding="utf-8") as outfile:
-                json_line = '{ "game_id": "' + self.game_id + '", "turn": ' + str(self.turn) + \
-                            ', "player": "red", "move": "'+chr(column+65) + str(row+1) + \
-                            '", "url": "'+GameConfig.base_url + screenshot +'", "status": "'+game_result+'"}\n'
-                outfile.write(json_line)
+            logging.info("Turn %s: red player adds the next stone at %s%s", self.turn, chr(column+65), row+1)
+            self.check_last_move(row, column)
+            game_result = "running" if self.running==True  else "draw" if self.draw else "red wins"
+            json_line = '{ "game_id": "' + self.game_id + '", "turn": ' + str(self.turn) + \
+                        ', "player": "red", "move": "'+chr(column+65) + str(row+1) + \
+                        '", "url": "'+GameConfig.base_url + screenshot +'", "status": "'+game_result+'"}\n'
+            self.move_log.append(self.game_id, json_line)
         else:
-            logging.info(f"Turn {self.turn}: yellow player adds the next stone at {chr(column+65)}{row+1}")
-            self.check_game_over()
-            game_result = "running" if self.running==True  else "yellow wins"
-            with open(self.game_result_file, "a", encoding="utf-8") as outfile:
-                json_line = '{ "game_id": "' + self.game_id + '", "turn": ' + str(self.turn) + \
-                             ', "player": "yellow", "move": "'+chr(column+65) + str(row+1) + \
-                             '", "url": "'+GameConfig.base_url + screenshot +'", "status": "'+game_result+'"}\n'
-                outfile.write(json_line)
-
-    def check_game_over(self):
-        #go through all rows to determine whether there are four in a row
-        self.check_rows()        
-        if self.running:
-            #go through all columns to determine whether there are four in a row
-            self.check_columns()
-        if self.running:
-            #go through all diagonals to determine whether there are four across
-            self.check_cross()
-        
-    def check_rows(self):
-        for row in range(0, GameConfig.num_rows):
-            win_color = self.empty
-            subsequent_hits = 1
-            for column in range(0, GameConfig.num_columns):        
-                current_color = self.board[row][column]
-                logging.debug(f"checking row: {chr(column+65)}{row+1}")
-                if (current_color != self.empty and current_color == win_color):
-                    logging.info(f"subsequent stones: {subsequent_hits+1} in a row at {chr(column+65)}{row+1}")
-                    subsequent_hits += 1
-                    if subsequent_hits == 4:
-                        self.show_game_statistics(win_color)
-                        return
-                elif current_color != self.empty:
-                    win_color = current_color
-                    subsequent_hits = 1
-
-    def check_columns(self):  
-        for column in range(0, GameConfig.num_columns):        
-            win_color = self.empty
+            logging.info("Turn %s: yellow player adds the next stone at %s%s", self.turn, chr(column+65), row+1)
+            self.check_last_move(row, column)
+            game_result = "running" if self.running==True  else "draw" if self.draw else "yellow wins"
+            json_line = '{ "game_id": "' + self.game_id + '", "turn": ' + str(self.turn) + \
+                         ', "player": "yellow", "move": "'+chr(column+65) + str(row+1) + \
+                         '", "url": "'+GameConfig.base_url + screenshot +'", "status": "'+game_result+'"}\n'
+            self.move_log.append(self.game_id, json_line)
+
+        if not self.running:
+            self.move_log.close_game(self.game_id)
+
+    def check_last_move(self, row, column):
+        #only the lines through the stone that was just placed can have been completed
+        if row >= GameConfig.num_rows:
+            return
+        win_color = self.board[row][column]
+        for row_step, column_step in ((0, 1), (1, 0), (1, 1), (1, -1)):
             subsequent_hits = 1
-            for row in range(0, GameConfig.num_rows):
-                current_color = self.board[row][column]
-                logging.debug(f"checking column: {chr(column+65)}{row+1}")
-                if (current_color != self.empty and current_color == win_color):
-                    logging.info(f"subsequent stones: {subsequent_hits+1} in a column at {chr(column+65)}{row+1}")
+            for direction in (1, -1):
+                r = row + direction*row_step
+                c = column + direction*column_step
+                while 0 <= r < GameConfig.num_rows and 0 <= c < GameConfig.num_columns and self.board[r][c] == win_color:
                     subsequent_hits += 1
-                    if subsequent_hits == 4:
-                        self.show_game_statistics(win_color)
-                        return
-                elif current_color != self.empty:
-                    win_color = current_color
-                    subsequent_hits = 1
-
-    def check_cross(self): 
-        #check cross from left bottom to right upper
-        for column in range(0, GameConfig.num_columns-3):        
-            for row in range(0, GameConfig.num_rows-3):            
-                current_color = "empty"
-                if self.board[row][column] == self.red:
-                    current_color = "red"
-                elif self.board[row][column] == self.yellow:
-                    current_color = "yellow"
-                logging.debug(f"checking cross left: {chr(column+65)}{row+1} found color {current_color}")
-                win_color = self.board[row][column]
-                if win_color == self.empty:
-                    continue
-                if win_color == self.board[row+1][column+1]:
-                    logging.info(f"2 subsequent {current_color} stones cross left at {chr(column+65)}{row+1}")
-                    if win_color == self.board[row+2][column+2]:
-                        logging.info(f"3 subsequent {current_color} stones cross left at {chr(column+65)}{row+1}")
-                        if win_color == self.board[row+3][column+3]:
-                            self.show_game_statistics(win_color)
-                            return
-        #check cross from right bottom to left upper
-        for column in reversed(range(3, GameConfig.num_columns)):  
-            for row in range(0, GameConfig.num_rows-3):            
-                current_color = "empty"
-                if self.board[row][column] == self.red:
-                    current_color = "red"
-                elif self.board[row][column] == self.yellow:
-                    current_color = "yellow"
-                logging.debug(f"checking cross right: {chr(column+65)}{row+1} found color {current_color}")
-                win_color = self.board[row][column]
-                if win_color == self.empty:
-                    continue
-                if win_color == self.board[row+1][column-1]:                
-                    logging.info(f"2 subsequent {current_color} stones cross right at {chr(column+65)}{row+1}")
-                    if win_color == self.board[row+2][column-2]:
-                        logging.info(f"3 subsequent {current_color} stones cross right at {chr(column+65)}{row+1}")
-                        if win_color == self.board[row+3][column-3]:
-                            self.show_game_statistics(win_color)
-                            return
-                        
+                    r += direction*row_step
+                    c += direction*column_step
+            if subsequent_hits >= GameConfig.connect_length:
+                self.show_game_statistics(win_color)
+                return
+        #stones drop to the bottom, so the board is full when the top row is
+        if all(cell != self.empty for cell in self.board[GameConfig.num_rows-1]):
+            logging.info("draw")
+            self.draw = True
+            self.running = False
 
     def show_game_statistics(self, win_color):        
         if win_color == self.red:
@@ -449,7 +400,7 @@ class ConnectFour:
                 quit()
 
             elif event.type == pygame.KEYDOWN:
-                logging.debug(f"Keydown detected: {event.key}")
+                logging.debug("Keydown detected: %s", event.key)
                 if event.key in (pygame.K_1, pygame.K_a):
                     self.add_stone(1)
                 elif event.key in (pygame.K_2, pygame.K_b):
@@ -485,12 +436,12 @@ class ConnectFour:
         pygame.quit()
 
     def processHttpMove(self, coordinates):
-        logging.info(f"received http call with arguments {coordinates}")
+        logging.info("received http call with arguments %s", coordinates)
         column = ord(coordinates[0])-64
-        if column > -1 and column < GameConfig.num_columns:
+        if 1 <= column <= GameConfig.num_columns:
             return self.add_stone(column)
         else:
-            logging.info()
+            logging.info("illegal move: column %s does not exist", coordinates[0])
             return "illegal move: specified column does not exist"
 
 
@@ -498,7 +449,7 @@ def start_http_server(port=8000):
     """Start the HTTP server in a separate thread so it doesn't block the game"""
     GameRequestHandler.game_instance = my_game
     server = HTTPServer(('localhost', port), GameRequestHandler)
-    logging.info(f"Starting HTTP server on port {port}")
+    logging.info("Starting HTTP server on port %s", port)
     
     server_thread = threading.Thread(target=server.serve_forever, daemon=True)
     server_thread.start()
@@ -509,7 +460,7 @@ def start_http_server(port=8000):
 if __name__ == "__main__":
     my_game = ConnectFour()
 
-    logging.basicConfig(filename='four-wins.log', level=logging.INFO)
+    setup_logging()
     # Start your HTTP server
     http_server = start_http_server(8000)
 
@@ -1,88 +1,237 @@
+import argparse
+import dataclasses
+import io
 import threading
 from http.server import HTTPServer
 import json
 import logging
-import pygame
 import uuid
-import random
-from enum import IntEnum
-from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from GameRequestHandler import GameRequestHandler 
-from GameConfig import GameConfig
+from GameConfig import GameConfig, GameSettings, get_settings
+from BitBoard import BitBoard
+from Solver import Solver, AI_LEVELS
+from PositionEvaluator import PositionEvaluator
+from Agents import Agent, get_agent_pool, make_agent
+from OpeningBook import OpeningBook
+from GameModel import Player, GameState, GameMove
+from ScreenshotWriter import get_screenshot_writer
+from ImageCache import get_image_cache
+from GameRegistry import GameRegistry
+from PooledHTTPServer import PooledHTTPServer
+from MoveLog import get_move_log
+from GameStore import get_game_store
+from GameLogging import setup_logging
+from Metrics import get_metrics, register_cache
+
+# screenshot options of a batch of moves, see ConnectFour.process_http_moves
+BATCH_SCREENSHOTS = ("all", "final", "none")
+
+_stage_seconds = get_metrics().histogram("four_wins_stage_seconds", "Time spent in each stage of a move", ("stage",))
+AI_MOVE_TIME = _stage_seconds.labels("ai_move")
+SCREENSHOT_TIME = _stage_seconds.labels("screenshot")
+MOVE_LOG_TIME = _stage_seconds.labels("move_log")
+GAME_STORE_TIME = _stage_seconds.labels("game_store")
+LAZY_RENDER_TIME = _stage_seconds.labels("lazy_render")
+MOVES = get_metrics().counter("four_wins_moves_total", "Moves played in all games")
+GAMES_STARTED = get_metrics().counter("four_wins_games_started_total", "Games started")
+GAMES_FINISHED = get_metrics().counter("four_wins_games_finished_total", "Games finished by result", ("result",))
+
+if TYPE_CHECKING:
+    from BoardRenderer import BoardRenderer
+
+# renderers by the settings they draw with, shared by all games of the process; the
+# least recently used ones are dropped, every reloaded configuration adds one
+MAX_RENDERERS = 8
+_renderers: "OrderedDict[GameSettings, BoardRenderer]" = OrderedDict()
+_render_lock = threading.Lock()
+
+
+def get_renderer(settings: GameSettings) -> "BoardRenderer":
+    """Return the renderer for games with these settings, importing pygame and loading the font on first use."""
+    with _render_lock:
+        renderer = _renderers.get(settings)
+        if renderer is None:
+            import pygame
+            from BoardRenderer import BoardRenderer
+            pygame.font.init()
+            renderer = BoardRenderer(pygame.font.Font(settings.font, settings.font_size), settings)
+            _renderers[settings] = renderer
+            if len(_renderers) > MAX_RENDERERS:
+                _renderers.popitem(last=False)
+        else:
+            _renderers.move_to_end(settings)
+        return renderer
+
+
+class BoardView:
+    """Read-only board[row][column] view of a BitBoard, returning Player values."""
+
+    def __init__(self, position: BitBoard):
+        self._position = position
 
+    def __len__(self) -> int:
+        return self._position.rows
 
-class Player(IntEnum):
-    EMPTY = 0
-    RED = 1
-    YELLOW = 2
+    def __getitem__(self, row: int) -> "BoardRowView":
+        if row < 0:
+            row += self._position.rows
+        if not 0 <= row < self._position.rows:
+            raise IndexError("board row out of range")
+        return BoardRowView(self._position, row)
 
+    def __iter__(self):
+        for row in range(self._position.rows):
+            yield BoardRowView(self._position, row)
 
-class GameState(IntEnum):
-    RUNNING = 0
-    RED_WINS = 1
-    YELLOW_WINS = 2
-    DRAW = 3
 
+class BoardRowView:
+    """A single row of a BoardView."""
 
-@dataclass
-class GameMove:
-    player: Player
-    column: int
-    row: int
-    turn: int
+    def __init__(self, position: BitBoard, row: int):
+        self._position = position
+        self._row = row
+
+    def __len__(self) -> int:
+        return self._position.columns
+
+    def __getitem__(self, column: int) -> Player:
+        if column < 0:
+            column += self._position.columns
+        return Player(self._position.cell(self._row, column))
+
+    def __iter__(self):
+        for column in range(self._position.columns):
+            yield Player(self._position.cell(self._row, column))
 
 
 class ConnectFour:
-    def __init__(self):
-        pygame.init()
-        GameConfig.load()
-        
-        # Initialize pygame components
-        self.screen = pygame.display.set_mode((GameConfig.width, GameConfig.height))
-        self.clock = pygame.time.Clock()
-        self.font = pygame.font.Font(GameConfig.font, GameConfig.font_size)
-        pygame.display.set_caption('Four wins - VLM edition')
+    def __init__(self, headless: Optional[bool] = None, shared: Optional["ConnectFour"] = None, **options):
+        """Create a game, with a window unless headless, and start it with new_game(**options).
+
+        A game created with shared reuses the opening book, transposition table and
+        evaluator of that game instead of building its own, see spawn_game.
+        pygame is imported and the font and board images are created when something
+        is drawn for the first time; the window is opened by run.
+        Every game plays with the settings snapshot taken when it started, see new_game.
+        """
+        if shared is None:
+            GameConfig.load()
+        self.headless = GameConfig.headless if headless is None else headless
+        self.settings = get_settings()
+
+        self.screen = None
+        self.clock = None
+        self._renderer: Optional["BoardRenderer"] = None
+        # image of the current board, None until it is drawn
+        self._frame = None
         
         # Game state
         self.game_id = ""
         self.current_player = Player.RED
         self.turn = 1
         self.state = GameState.RUNNING
-        self.board = [[Player.EMPTY for _ in range(GameConfig.num_columns)] 
-                     for _ in range(GameConfig.num_rows)]
+        self.position = BitBoard(self.settings.num_rows, self.settings.num_columns, self.settings.connect_length)
         self.move_history: List[GameMove] = []
-        
-        # Visual properties
-        self.radius = (self.screen.get_height() - 3 * GameConfig.border_size) / (GameConfig.num_rows + 1) / 2
-        self.space = self.radius / 8
-        
-        self.new_game()
-
-    def new_game(self) -> str:
-        """Initialize a new game and return the game ID."""
+        self.ai_level = self.settings.ai_level
+        self.solver = Solver(table=shared.solver.table) if shared else Solver()
+        self.opening_book = shared.opening_book if shared else OpeningBook(GameConfig.opening_book)
+        # answers /evaluate requests, shared by all games of the server
+        self.evaluator = shared.evaluator if shared else PositionEvaluator(
+            self.opening_book, self.solver.table, GameConfig.ai_time_budget, GameConfig.evaluation_cache_size)
+        self.move_log = get_move_log()
+        self.store = get_game_store()
+        # switched off while a batch of moves is applied without screenshots
+        self.capture_screenshots = True
+        # held while the game changes, shared with the session of the game in the registry
+        self.lock = threading.Lock()
+
+        self.new_game(**options)
+
+    def spawn_game(self, **options) -> "ConnectFour":
+        """Create another headless game that shares the expensive resources of this one.
+
+        options are passed on to new_game, so the game is only set up once.
+        """
+        return ConnectFour(headless=True, shared=self, **options)
+
+    def new_game(self, ai_level: Optional[str] = None, red: Optional[str] = None,
+                 yellow: Optional[str] = None) -> str:
+        """Initialize a new game and return the game ID.
+
+        red and yellow name the agents of both colours (see Agents.make_agent), by
+        default a human plays red against the AI. ai_level selects the strength of
+        the default AI opponent (see Solver.AI_LEVELS), by default the level from
+        the settings is used. If an agent moves first it does so before this returns,
+        or in the background with ai_mode "background".
+        The game takes the current settings snapshot, a reloaded configuration
+        applies from the next new game on.
+        """
+        settings = get_settings()
+        ai_level = ai_level or settings.ai_level
+        if ai_level not in AI_LEVELS:
+            raise ValueError(f"Unknown AI level '{ai_level}', choose one of {', '.join(AI_LEVELS)}")
+        agents = {
+            Player.RED: make_agent(red or "human", self.solver, self.opening_book, settings=settings),
+            Player.YELLOW: make_agent(yellow or ai_level, self.solver, self.opening_book, settings=settings),
+        }
+        if settings is not self.settings:
+            self.settings = settings
+            self._renderer = None
+            if ((self.position.rows, self.position.columns, self.position.connect)
+                    != (settings.num_rows, settings.num_columns, settings.connect_length)):
+                self.position = BitBoard(settings.num_rows, settings.num_columns, settings.connect_length)
+        self.ai_level = ai_level
+        self.agents = agents
+        if self.game_id:
+            # the previous game is abandoned, its log needs no open file anymore
+            self.move_log.close_game(self.game_id)
         self.game_id = str(uuid.uuid4())
         self.current_player = Player.RED
         self.turn = 1
         self.state = GameState.RUNNING
         self.move_history.clear()
-        
-        # Clear board
-        for row in range(GameConfig.num_rows):
-            for col in range(GameConfig.num_columns):
-                self.board[row][col] = Player.EMPTY
+        self.position.reset()
+        self._frame = None
                 
-        logging.info(f"New game started with ID: {self.game_id}")
+        GAMES_STARTED.inc()
+        logging.info("New game started with ID: %s (red %s, yellow %s)", self.game_id,
+                     agents[Player.RED].name, agents[Player.YELLOW].name, extra={"game_id": self.game_id})
+        self.play_agent_turns()
         return self.game_id
 
-    def _get_display_color(self, player: Player) -> tuple:
-        """Get the display color for a player."""
-        color_map = {
-            Player.EMPTY: GameConfig.empty_color,
-            Player.RED: GameConfig.red_color,
-            Player.YELLOW: GameConfig.yellow_color
-        }
-        return color_map.get(player, GameConfig.empty_color)
+    @property
+    def renderer(self) -> "BoardRenderer":
+        """Board renderer for the settings of the game, looked up when the first board image is drawn."""
+        if self._renderer is None:
+            self._renderer = get_renderer(self.settings)
+        return self._renderer
+
+    @property
+    def font(self):
+        """Font of the board labels."""
+        return self.renderer.font
+
+    @property
+    def radius(self) -> float:
+        return self.renderer.radius
+
+    @property
+    def space(self) -> float:
+        return self.renderer.space
+
+    @property
+    def frame(self):
+        """Image of the current board, drawn on first use and kept up to date by draw_stone."""
+        if self._frame is None:
+            self._frame = self.renderer.render_board(self.position)
+        return self._frame
+
+    @property
+    def board(self) -> BoardView:
+        """Row/column view of the current position, board[row][col] with row 0 at the bottom."""
+        return BoardView(self.position)
 
     def _column_to_letter(self, column: int) -> str:
         """Convert column index to letter (0->A, 1->B, etc.)."""
@@ -94,66 +243,36 @@ class ConnectFour:
 
     def render_text(self, text: str, pos_x: int, pos_y: int):
         """Render text at specified position."""
-        rendered_text = self.font.render(text, True, GameConfig.text_color, GameConfig.bg_color)
+        rendered_text = self.font.render(text, True, self.settings.text_color, self.settings.bg_color)
         text_rect = rendered_text.get_rect(center=(pos_x, pos_y))
         self.screen.blit(rendered_text, text_rect)
 
     def render_environment(self):
-        """Render the game board background and labels."""
-        self.screen.fill("black")
-        
-        # Draw main game area
-        border = GameConfig.border_size
-        rect = pygame.Rect(border, border, 
-                          GameConfig.width - 2*border, 
-                          GameConfig.height - 2*border)
-        pygame.draw.rect(self.screen, GameConfig.bg_color, rect)
-
-        # Draw empty circles for board positions
-        for col in range(1, GameConfig.num_columns + 1):
-            for row in range(1, GameConfig.num_rows + 1):
-                x = col * 2 * (self.radius + self.space) - border
-                y = row * 2 * (self.radius + self.space) - border
-                pygame.draw.circle(self.screen, Player.EMPTY, (x, y), self.radius)
-
-        # Draw row labels
-        for i in range(GameConfig.num_rows):
-            text = str(GameConfig.num_rows - i)
-            y = 10 + 2*border + GameConfig.font_size + i*2*(self.radius + self.space)
-            self.render_text(text, GameConfig.font_size//2, y)
-
-        # Draw column labels
-        for i in range(GameConfig.num_columns):
-            text = self._column_to_letter(i)
-            x = (i+1) * 2 * (self.radius + self.space) - 4*self.space
-            y = self.screen.get_height() - border
-            self.render_text(text, x, y)
+        """Render the game board background and labels to the window."""
+        if self.screen is not None:
+            self.screen.blit(self.renderer.template, (0, 0))
 
     def draw_stone(self, player: Player, column: int, row: int):
-        """Draw a stone at the specified board position."""
-        x = (column + 1) * 2 * (self.radius + self.space) - GameConfig.border_size
-        y = (GameConfig.num_rows - row) * 2 * (self.radius + self.space) - GameConfig.border_size
-        color = self._get_display_color(player)
-        pygame.draw.circle(self.screen, color, (x, y), self.radius)
+        """Draw a stone at the specified board position of the current frame."""
+        # a frame that is not drawn yet will show the stone when it is
+        if self._frame is not None:
+            self.renderer.draw_stone(self._frame, player, column, row)
 
     def render_stones(self):
-        """Render all stones on the board."""
-        for row in range(GameConfig.num_rows):
-            for col in range(GameConfig.num_columns):
-                self.draw_stone(self.board[row][col], col, row)
+        """Redraw all stones of the current frame and show it in the window."""
+        self._frame = self.renderer.render_board(self.position)
+        if self.screen is not None:
+            self.screen.blit(self.frame, (0, 0))
 
     def is_valid_move(self, column: int) -> bool:
         """Check if a move in the given column is valid."""
-        return (0 <= column < GameConfig.num_columns and 
-                self.board[GameConfig.num_rows - 1][column] == Player.EMPTY and
-                self.state == GameState.RUNNING)
+        return self.state == GameState.RUNNING and self.position.can_play(column)
 
     def get_next_row(self, column: int) -> int:
         """Get the next available row in a column."""
-        for row in range(GameConfig.num_rows):
-            if self.board[row][column] == Player.EMPTY:
-                return row
-        return -1
+        if not self.position.can_play(column):
+            return -1
+        return self.position.heights[column]
 
     def add_stone(self, column: int) -> str:
         """Add a stone to the specified column (1-indexed)."""
@@ -161,150 +280,258 @@ class ConnectFour:
         
         if not self.is_valid_move(column_idx):
             return "Invalid move"
+        if not self.agents[self.current_player].interactive:
+            return "Not your turn"
         
-        row = self.get_next_row(column_idx)
-        if row == -1:
+        if self.get_next_row(column_idx) == -1:
             return "Column full"
+
+        move = self._play(column_idx)
+
+        # AI move if it's yellow's turn and game is still running
+        self.play_agent_turns()
             
-        # Place the stone
-        self.board[row][column_idx] = self.current_player
+        return f"{{'url': '{self.settings.base_url}/screens/{self.game_id}_turn{self.turn-1}.png'}}"
+
+    def _play(self, column_idx: int) -> GameMove:
+        """Place a stone of the current player in a playable column (0-indexed) and record it."""
+        row = self.get_next_row(column_idx)
+        self.position.play(column_idx)
         move = GameMove(self.current_player, column_idx, row, self.turn)
         self.move_history.append(move)
         
-        # Record move and check for win
-        self._record_move(move)
+        # Check for win and record move, so that the record of the last move has the result
         self._check_game_over()
+        self._record_move(move)
+        MOVES.inc()
+        if self.state != GameState.RUNNING:
+            GAMES_FINISHED.labels(self.state.name.lower()).inc()
+            self.move_log.close_game(self.game_id)
         
         # Switch players
         self.current_player = Player.YELLOW if self.current_player == Player.RED else Player.RED
         self.turn += 1
-        
-        # AI move if it's yellow's turn and game is still running
-        if self.current_player == Player.YELLOW and self.state == GameState.RUNNING:
-            self._make_ai_move(move)
-            
-        return f"{{'url': '{GameConfig.base_url}/screens/{self.game_id}_turn{self.turn-1}.png'}}"
-
-    def _make_ai_move(self, last_move: GameMove):
-        """Make an AI move using simple strategy."""
-        # Try to block winning moves first
-        blocking_col = self._find_blocking_move(last_move)
-        if blocking_col != -1:
-            logging.info(f"AI blocking at column {blocking_col + 1}")
-            self.add_stone(blocking_col + 1)
-        else:
-            # Random move
-            valid_columns = [col for col in range(GameConfig.num_columns) 
-                           if self.is_valid_move(col)]
-            if valid_columns:
-                column = random.choice(valid_columns)
-                logging.info(f"AI random move at column {column + 1}")
-                self.add_stone(column + 1)
-
-    def _find_blocking_move(self, last_move: GameMove) -> int:
-        """Find a column to block the opponent's winning move."""
-        # Check for three in a row/column/diagonal that need blocking
-        threats = [
-            self._check_row_threat(last_move),
-            self._check_column_threat(last_move),
-            self._check_diagonal_threat(last_move)
-        ]
-        
-        for threat in threats:
-            if threat != -1:
-                return threat
-        return -1
-
-    def _check_row_threat(self, last_move: GameMove) -> int:
-        """Check for horizontal threats and return blocking column."""
-        row, col = last_move.row, last_move.column
-        player = last_move.player
-        
-        # Count consecutive stones in both directions
-        count = 1
-        left_end = col
-        right_end = col
-        
-        # Count left
-        for c in range(col - 1, -1, -1):
-            if self.board[row][c] == player:
-                count += 1
-                left_end = c
-            else:
-                break
-                
-        # Count right  
-        for c in range(col + 1, GameConfig.num_columns):
-            if self.board[row][c] == player:
-                count += 1
-                right_end = c
-            else:
-                break
-                
-        # Check if we can block
-        if count >= 3:
-            # Check left side
-            if left_end > 0 and self.board[row][left_end - 1] == Player.EMPTY:
-                if row == 0 or self.board[row - 1][left_end - 1] != Player.EMPTY:
-                    return left_end - 1
-            # Check right side
-            if right_end < GameConfig.num_columns - 1 and self.board[row][right_end + 1] == Player.EMPTY:
-                if row == 0 or self.board[row - 1][right_end + 1] != Player.EMPTY:
-                    return right_end + 1
-        return -1
-
-    def _check_column_threat(self, last_move: GameMove) -> int:
-        """Check for vertical threats and return blocking column."""
-        row, col = last_move.row, last_move.column
-        player = last_move.player
-        
-        # Count consecutive stones going down
-        count = 1
-        for r in range(row - 1, -1, -1):
-            if self.board[r][col] == player:
-                count += 1
-            else:
-                break
-                
-        # If 3 in a column, block above
-        if count >= 3 and row + 1 < GameConfig.num_rows:
-            if self.board[row + 1][col] == Player.EMPTY:
-                return col
-        return -1
+        return move
+
+    def process_http_moves(self, moves: str, screenshots: str = "all") -> Dict:
+        """Apply a sequence of column letters, e.g. "DDCEF", in one call.
+
+        The letters are plies of both players in turn, the agents do not answer
+        them one by one. If an agent is to move after the sequence it replies, see
+        play_agent_turns.
+        screenshots is one of BATCH_SCREENSHOTS: "all" captures every move,
+        "final" only the last position and "none" no screenshot at all.
+        The sequence stops at the first invalid move or when the game is over.
+        """
+        if screenshots not in BATCH_SCREENSHOTS:
+            raise ValueError(f"Unknown screenshots option '{screenshots}', "
+                             f"choose one of {', '.join(BATCH_SCREENSHOTS)}")
+        first = len(self.move_history)
+        error = None
+        self.capture_screenshots = screenshots == "all"
+        try:
+            for index, letter in enumerate(moves):
+                if self.state != GameState.RUNNING:
+                    error = {'index': index, 'move': letter, 'result': "Game over"}
+                    break
+                column = self._letter_to_column(letter)
+                if not 0 <= column < self.settings.num_columns:
+                    error = {'index': index, 'move': letter, 'result': "Invalid column"}
+                    break
+                if not self.is_valid_move(column):
+                    error = {'index': index, 'move': letter, 'result': "Column full"}
+                    break
+                self._play(column)
+            if len(self.move_history) > first:
+                self.play_agent_turns()
+        finally:
+            self.capture_screenshots = True
+
+        played = self.move_history[first:]
+        if screenshots == "final" and played:
+            self._capture_screenshot(played[-1].turn)
+        results = []
+        for move in played:
+            result = {
+                'turn': move.turn,
+                'player': "red" if move.player == Player.RED else "yellow",
+                'move': f"{self._column_to_letter(move.column)}{move.row + 1}",
+            }
+            if screenshots == "all" or (screenshots == "final" and move is played[-1]) \
+                    or self.settings.screenshot_mode == "lazy":
+                result['url'] = f"{self.settings.base_url}/screens/{self.game_id}_turn{move.turn}.png"
+            results.append(result)
+        return {
+            'results': results,
+            'error': error,
+            'game-status': self._get_game_status_string(),
+        }
 
-    def _check_diagonal_threat(self, last_move: GameMove) -> int:
-        """Check for diagonal threats and return blocking column."""
-        # Simplified diagonal check - can be expanded
-        return -1
+    def close(self):
+        """Release the resources of the current game, called when its session ends."""
+        self.move_log.close_game(self.game_id)
+
+    def play_agent_turns(self):
+        """Let the agents move until an interactive player is to move or the game is over.
+
+        With ai_mode "sync" the moves are made before this returns. With
+        "background" they are made on the agent thread pool and appear in the
+        game as soon as each search is done.
+        """
+        if self.settings.ai_mode == "background":
+            if self._agent_to_move() is not None:
+                get_agent_pool().submit(self._background_agent_turn, self.game_id)
+            return
+        while self._play_agent_turn():
+            pass
+
+    def _agent_to_move(self) -> Optional[Agent]:
+        """Return the agent to move if it chooses its moves itself, None otherwise."""
+        if self.state != GameState.RUNNING:
+            return None
+        agent = self.agents[self.current_player]
+        return None if agent.interactive else agent
+
+    def _play_agent_turn(self) -> bool:
+        """Play one move of the agent to move, False if it is not an agent's turn."""
+        agent = self._agent_to_move()
+        if agent is None:
+            return False
+        with AI_MOVE_TIME.time():
+            column = agent.choose(self.position.copy(), self.settings.ai_time_budget)
+        self._play(column)
+        return True
+
+    def _background_agent_turn(self, game_id: str):
+        # the search runs without the lock, so the game stays readable meanwhile
+        with self.lock:
+            agent = self._agent_to_move() if self.game_id == game_id else None
+            if agent is None:
+                return
+            position = self.position.copy()
+        try:
+            with AI_MOVE_TIME.time():
+                column = agent.choose(position, self.settings.ai_time_budget)
+        except Exception as e:
+            logging.error("Agent %s failed in game %s: %s", agent.name, game_id, e, extra={"game_id": game_id})
+            return
+        with self.lock:
+            # a new game or a move submitted meanwhile makes the result stale
+            if self.game_id != game_id or self.position.moves != position.moves:
+                return
+            self._play(column)
+            self.play_agent_turns()
 
     def _record_move(self, move: GameMove):
         """Record move to file and capture screenshot."""
-        self._capture_screenshot()
+        self.draw_stone(move.player, move.column, move.row)
+        if self.capture_screenshots:
+            with SCREENSHOT_TIME.time():
+                self._capture_screenshot(move.turn)
         
         game_result = self._get_game_status_string()
         player_name = "red" if move.player == Player.RED else "yellow"
         move_notation = f"{self._column_to_letter(move.column)}{move.row + 1}"
-        screenshot_url = f"{GameConfig.base_url}/screens/{self.game_id}_turn{move.turn}.png"
+        screenshot_url = f"{self.settings.base_url}/screens/{self.game_id}_turn{move.turn}.png"
         
-        result_file = f"./screens/{self.game_id}.jsonl"
-        with open(result_file, "a", encoding="utf-8") as f:
-            json_data = {
-                "game_id": self.game_id,
-                "turn": move.turn,
-                "player": player_name,
-                "move": move_notation,
-                "url": screenshot_url,
-                "status": game_result
-            }
-            f.write(json.dumps(json_data) + "\n")
+        json_data = {
+            "game_id": self.game_id,
+            "turn": move.turn,
+            "player": player_name,
+            "move": move_notation,
+            "url": screenshot_url,
+            "status": game_result,
+            # the board size of the game, so that it can be replayed after a reload changed it
+            "rows": self.position.rows,
+            "columns": self.position.columns,
+            "connect": self.position.connect,
+        }
+        # the game store is opened at startup, without it moves always go to the move log
+        if self.settings.storage != "sqlite" or self.store is None:
+            # buffered, written to ./screens/<game_id>.jsonl by the move log
+            with MOVE_LOG_TIME.time():
+                self.move_log.append(self.game_id, json.dumps(json_data) + "\n")
+        if self.store is not None and self.settings.storage != "jsonl":
+            opening = "".join(self._column_to_letter(m.column)
+                              for m in self.move_history[:self.settings.opening_length])
+            with GAME_STORE_TIME.time():
+                self.store.record_move(self.game_id, move.turn, player_name, move_notation, screenshot_url,
+                                       game_result, opening, self.ai_level,
+                                       (self.position.rows, self.position.columns, self.position.connect))
             
-        logging.info(f"Turn {move.turn}: {player_name} -> {move_notation}")
+        logging.info("Turn %d: %s -> %s", move.turn, player_name, move_notation,
+                     extra={"game_id": self.game_id, "turn": move.turn, "player": player_name, "move": move_notation})
 
-    def _capture_screenshot(self):
+    def _capture_screenshot(self, turn: int):
         """Capture and save screenshot of current game state."""
-        self.render_stones()
-        filename = f"./screens/{self.game_id}_turn{self.turn}.png"
-        pygame.image.save(self.screen, filename)
+        if self.settings.screenshot_mode in ("none", "lazy"):
+            # in lazy mode screenshots are rendered from the move log when requested
+            return
+        filename = f"./screens/{self.game_id}_turn{turn}.png"
+        if self.settings.screenshot_mode == "async":
+            # encoded in a worker process, the URL is valid before the file exists
+            get_screenshot_writer().submit(filename, self.settings, tuple(self.position.history))
+        else:
+            import pygame
+            pygame.image.save(self.frame, filename)
+
+    def render_screenshot(self, game_id: str, turn: int) -> Optional[bytes]:
+        """Return the PNG image of a game after the given turn, or None if there is no such turn.
+
+        The board is replayed from the move list of the game, with the board size it
+        was played with, and the encoded image is kept in the shared LRU image cache.
+        """
+        cache = get_image_cache()
+        key = (game_id, turn)
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+        loaded = self._load_moves(game_id)
+        if loaded is None or not 1 <= turn <= len(loaded[1]):
+            return None
+        (rows, columns, connect), moves = loaded
+        settings = self.settings
+        if (rows, columns, connect) != (settings.num_rows, settings.num_columns, settings.connect_length):
+            # played before a reloaded configuration changed the board size
+            settings = dataclasses.replace(settings, num_rows=rows, num_columns=columns, connect_length=connect)
+        with LAZY_RENDER_TIME.time():
+            import pygame
+            position = BitBoard(rows, columns, connect)
+            for column in moves[:turn]:
+                position.play(column)
+            buffer = io.BytesIO()
+            pygame.image.save(get_renderer(settings).render_board(position), buffer, "png")
+            data = buffer.getvalue()
+        cache.put(key, data)
+        return data
+
+    def _load_moves(self, game_id: str) -> Optional[Tuple[Tuple[int, int, int], List[int]]]:
+        """Return the board size (rows, columns, connect length) and the columns played in a game.
+
+        The game is read from memory, its move log or the game store. Games recorded
+        without their board size are taken to have the size of the current game.
+        """
+        board = (self.position.rows, self.position.columns, self.position.connect)
+        if game_id == self.game_id:
+            return board, [move.column for move in self.move_history]
+        records = None
+        self.move_log.flush(game_id)
+        try:
+            with open(self.move_log.path(game_id), encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            pass
+        if not records and self.store is not None:
+            records = self.store.load_moves(game_id)
+        if not records:
+            return None
+        try:
+            if "rows" in records[0]:
+                board = (records[0]["rows"], records[0]["columns"], records[0]["connect"])
+            return board, [self._letter_to_column(record["move"][0]) for record in records]
+        except (KeyError, IndexError, TypeError):
+            return None
 
     def _get_game_status_string(self) -> str:
         """Get string representation of current game state."""
@@ -321,43 +548,18 @@ class ConnectFour:
         winner = self._check_winner()
         if winner != Player.EMPTY:
             self.state = GameState.RED_WINS if winner == Player.RED else GameState.YELLOW_WINS
-            logging.info(f"Game over: {self._get_game_status_string()}")
+            logging.info("Game over: %s", self._get_game_status_string(), extra={"game_id": self.game_id})
         elif self._is_board_full():
             self.state = GameState.DRAW
-            logging.info("Game over: draw")
+            logging.info("Game over: draw", extra={"game_id": self.game_id})
 
     def _check_winner(self) -> Player:
         """Check if there's a winner and return the winning player."""
-        # Check all possible winning combinations
-        for row in range(GameConfig.num_rows):
-            for col in range(GameConfig.num_columns):
-                player = self.board[row][col]
-                if player == Player.EMPTY:
-                    continue
-                    
-                # Check all directions from this position
-                directions = [(0, 1), (1, 0), (1, 1), (1, -1)]  # right, down, diagonal-right, diagonal-left
-                for dr, dc in directions:
-                    if self._check_line(row, col, dr, dc, player):
-                        return player
-        return Player.EMPTY
-
-    def _check_line(self, start_row: int, start_col: int, dr: int, dc: int, player: Player) -> bool:
-        """Check if there are 4 consecutive stones in a line."""
-        count = 0
-        for i in range(4):
-            r, c = start_row + i * dr, start_col + i * dc
-            if (0 <= r < GameConfig.num_rows and 0 <= c < GameConfig.num_columns and 
-                self.board[r][c] == player):
-                count += 1
-            else:
-                break
-        return count == 4
+        return Player(self.position.winner())
 
     def _is_board_full(self) -> bool:
         """Check if the board is full."""
-        return all(self.board[GameConfig.num_rows - 1][col] != Player.EMPTY 
-                  for col in range(GameConfig.num_columns))
+        return self.position.is_full()
 
     def process_http_move(self, coordinates: str) -> str:
         """Process a move received via HTTP."""
@@ -366,15 +568,20 @@ class ConnectFour:
             
         try:
             column = self._letter_to_column(coordinates[0])
-            if 0 <= column < GameConfig.num_columns:
+            if 0 <= column < self.settings.num_columns:
                 return self.add_stone(column + 1)  # Convert to 1-indexed
             else:
                 return "Invalid column"
         except (IndexError, ValueError):
             return "Invalid move format"
 
+    # names used by GameRequestHandler
+    processHttpMove = process_http_move
+    processHttpMoves = process_http_moves
+
     def handle_keyboard_input(self):
         """Handle keyboard input for local play."""
+        import pygame
         keys = pygame.key.get_pressed()
         key_mappings = {
             (pygame.K_1, pygame.K_a): 1,
@@ -388,12 +595,24 @@ class ConnectFour:
         
         for key_combo, column in key_mappings.items():
             if any(keys[key] for key in key_combo):
-                if self.is_valid_move(column - 1):  # Convert to 0-indexed for validation
-                    self.add_stone(column)
+                with self.lock:
+                    if self.is_valid_move(column - 1):  # Convert to 0-indexed for validation
+                        self.add_stone(column)
                 break
 
+    def open_window(self):
+        """Initialize pygame and open the game window."""
+        import pygame
+        pygame.init()
+        self.screen = pygame.display.set_mode((self.settings.width, self.settings.height))
+        pygame.display.set_caption('Four wins - VLM edition')
+        self.clock = pygame.time.Clock()
+
     def run(self):
         """Main game loop."""
+        import pygame
+        if self.screen is None:
+            self.open_window()
         self.render_environment()
         running = True
         
@@ -402,7 +621,7 @@ class ConnectFour:
                 if event.type == pygame.QUIT:
                     running = False
 
-            self.render_stones()
+            self.screen.blit(self.frame, (0, 0))
             self.handle_keyboard_input()
             
             pygame.display.flip()
@@ -411,30 +630,65 @@ class ConnectFour:
         pygame.quit()
 
 
-def start_http_server(game_instance, port: int = 8000):
-    """Start HTTP server for remote game access."""
+def start_http_server(game_instance, port: int = 8000, background: bool = True):
+    """Start HTTP server for remote game access.
+
+    Every POST /four-wins starts a separate game, created with game_instance.spawn_game.
+    game_instance itself stays registered as the game played from the window.
+    With background=False the server runs on the calling thread until interrupted.
+    """
     GameRequestHandler.game_instance = game_instance
-    server = HTTPServer(('localhost', port), GameRequestHandler)
-    logging.info(f"Starting HTTP server on port {port}")
+    GameRequestHandler.registry = GameRegistry(game_instance.spawn_game,
+                                               GameConfig.max_sessions, GameConfig.session_ttl)
+    GameRequestHandler.registry.add(game_instance, pinned=True)
+    get_metrics().gauge("four_wins_live_games", "Games held by the session registry") \
+        .set_function(GameRequestHandler.registry.__len__)
+    register_cache("evaluation", game_instance.evaluator)
+    if GameConfig.http_server == "threaded":
+        # keep-alive connections need HTTP/1.1, idle ones wait in the server's selector, not in a worker
+        GameRequestHandler.protocol_version = "HTTP/1.1"
+        GameRequestHandler.timeout = GameConfig.http_keepalive_timeout
+        server = PooledHTTPServer(('localhost', port), GameRequestHandler, GameConfig.http_workers,
+                                  GameConfig.http_keepalive_timeout)
+    else:
+        GameRequestHandler.protocol_version = "HTTP/1.0"
+        server = HTTPServer(('localhost', port), GameRequestHandler)
+    logging.info("Starting %s HTTP server on port %d", GameConfig.http_server, port)
     
+    if not background:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("HTTP server stopped")
+        finally:
+            server.server_close()
+        return server
+
     server_thread = threading.Thread(target=server.serve_forever, daemon=True)
     server_thread.start()
     return server
 
 
 if __name__ == "__main__":
-    # Setup logging
-    logging.basicConfig(
-        filename='four-wins.log', 
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
+    parser = argparse.ArgumentParser(description="Four wins - VLM edition")
+    parser.add_argument("--headless", action="store_true", default=None,
+                        help="run without a window and only serve HTTP requests")
+    parser.add_argument("--port", type=int, default=8000, help="HTTP server port")
+    args = parser.parse_args()
+
+    # Setup logging, records are written by a listener thread unless log_queue is off
+    GameConfig.load()
+    setup_logging()
     
     # Create game instance
-    game = ConnectFour()
+    game = ConnectFour(headless=args.headless)
     
-    # Start HTTP server
-    http_server = start_http_server(game, 8000)
-    
-    # Run the game
-    game.run()
\ No newline at end of file
+    if game.headless:
+        # Nothing to draw on screen, just serve requests
+        start_http_server(game, args.port, background=False)
+    else:
+        # Start HTTP server
+        http_server = start_http_server(game, args.port)
+        
+        # Run the game
+        game.run()
\ No newline at end of file
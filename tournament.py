@@ -0,0 +1,201 @@
+"""Headless self-play tournament between AI agents.
+
+Every pair of agents plays the same number of games, half of them with each
+colour, distributed over a pool of worker processes. Games start with a few
+random moves so that deterministic agents do not repeat the same game:
+
+    python tournament.py random blocker easy depth-4 --games 200 --workers 8
+
+Agents are AI levels (see Solver.AI_LEVELS), depth-N for a plain search of N moves,
+mcts or mcts-N for Monte Carlo tree search with the time budget or N playouts, or
+external:<url> for a program answering over HTTP, see Agents.make_agent.
+"""
+import argparse
+import dataclasses
+import itertools
+import json
+import math
+import os
+import random
+import time
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+from Agents import make_agent
+from BitBoard import BitBoard
+from GameConfig import GameConfig, GameSettings, get_settings
+from OpeningBook import OpeningBook
+from Solver import Solver, AI_LEVELS
+
+RED_WINS = 1
+DRAW = 0
+YELLOW_WINS = -1
+
+# per process state of the tournament workers, created once by _init_worker
+# one solver per colour, so that agents never read search results of their opponent
+_worker_solvers: Dict[int, Solver] = {}
+_worker_book: Optional[OpeningBook] = None
+_worker_settings: Tuple[int, int, int, float] = (6, 7, 4, 1.0)
+_worker_agent_settings: Optional[GameSettings] = None
+
+
+def check_agent(agent: str) -> str:
+    """Return the agent name if it can play without a human, raise ValueError otherwise."""
+    if make_agent(agent, None).interactive:
+        raise ValueError(f"Agent '{agent}' needs a human player")
+    return agent
+
+
+def _init_worker(rows: int, columns: int, connect: int, time_budget: float, book_path: Optional[str]):
+    global _worker_book, _worker_settings, _worker_agent_settings
+    _worker_solvers.update({color: Solver(table_size=1 << 18) for color in (BitBoard.RED, BitBoard.YELLOW)})
+    _worker_book = OpeningBook(book_path) if book_path else None
+    _worker_settings = (rows, columns, connect, time_budget)
+    # the tournament workers already use every core, MCTS rollouts stay in the worker
+    _worker_agent_settings = dataclasses.replace(get_settings(), mcts_workers=0)
+
+
+def _play_game(task) -> Tuple[str, str, int, int]:
+    """Play one game and return (red agent, yellow agent, result, number of moves)."""
+    red, yellow, seed, random_moves = task
+    rows, columns, connect, time_budget = _worker_settings
+    # a seed per game keeps results independent of how games are spread over the workers
+    rng = random.Random(seed)
+    agents = {color: make_agent(agent, _worker_solvers[color], _worker_book, rng, _worker_agent_settings)
+              for color, agent in ((BitBoard.RED, red), (BitBoard.YELLOW, yellow))}
+    # so that a search does not depend on the games the worker played before
+    for solver in _worker_solvers.values():
+        solver.table.clear()
+    position = BitBoard(rows, columns, connect)
+    while True:
+        if position.moves < random_moves:
+            column = rng.choice([column for column in range(columns) if position.can_play(column)])
+        else:
+            column = agents[position.player_to_move].choose(position, time_budget)
+        position.play(column)
+        if position.last_move_wins():
+            return red, yellow, RED_WINS if position.player_to_move == BitBoard.YELLOW else YELLOW_WINS, position.moves
+        if position.is_full():
+            return red, yellow, DRAW, position.moves
+
+
+def elo_ratings(scores: Dict[Tuple[str, str], List[float]], agents: List[str],
+                iterations: int = 2000) -> Dict[str, float]:
+    """Fit Elo ratings to the points scored between pairs of agents, averaging 1500.
+
+    scores[(a, b)] holds [points of a, games] against b. Every pairing counts one
+    extra draw, so that agents that win or lose every game get a finite rating.
+    """
+    ratings = {agent: 0.0 for agent in agents}
+    games = {}
+    for (a, b), (points, count) in scores.items():
+        games[(a, b)] = (points + 0.5, count + 1)
+    for _ in range(iterations):
+        change = 0.0
+        for agent in agents:
+            expected = actual = weight = 0.0
+            for (a, b), (points, count) in games.items():
+                if agent not in (a, b):
+                    continue
+                opponent, own = (b, points) if a == agent else (a, count - points)
+                p = 1 / (1 + 10 ** ((ratings[opponent] - ratings[agent]) / 400))
+                expected += count * p
+                actual += own
+                weight += count * p * (1 - p)
+            if weight > 0:
+                # Newton step on the log-likelihood of the agent's rating
+                step = (actual - expected) / weight * 400 / math.log(10)
+                ratings[agent] += step
+                change = max(change, abs(step))
+        if change < 0.01:
+            break
+    mean = sum(ratings.values()) / len(ratings)
+    return {agent: 1500 + rating - mean for agent, rating in ratings.items()}
+
+
+def run_tournament(agents: List[str], games: int, workers: int, seed: int, random_moves: int,
+                   rows: int, columns: int, connect: int, time_budget: float, book_path: Optional[str]) -> Dict:
+    """Play games games between every pair of agents and return the aggregated results."""
+    for agent in agents:
+        check_agent(agent)
+    tasks = []
+    for index, (a, b) in enumerate(itertools.combinations(agents, 2)):
+        for game in range(games):
+            red, yellow = (a, b) if game % 2 == 0 else (b, a)
+            tasks.append((red, yellow, seed * 1_000_003 + index * games + game, random_moves))
+
+    # wins, draws, losses of the first agent against the second
+    table = {(a, b): [0, 0, 0] for a in agents for b in agents if a != b}
+    moves = 0
+    started = time.perf_counter()
+    chunksize = max(1, len(tasks) // (workers * 16))
+    with Pool(workers, initializer=_init_worker, initargs=(rows, columns, connect, time_budget, book_path)) as pool:
+        for red, yellow, result, length in pool.imap_unordered(_play_game, tasks, chunksize=chunksize):
+            moves += length
+            table[(red, yellow)][1 - result] += 1
+            table[(yellow, red)][1 + result] += 1
+    elapsed = time.perf_counter() - started
+
+    scores = {(a, b): [wins + draws / 2, wins + draws + losses]
+              for (a, b), (wins, draws, losses) in table.items() if a < b}
+    return {
+        "agents": agents,
+        "games": len(tasks),
+        "seconds": elapsed,
+        "games_per_sec": len(tasks) / elapsed if elapsed > 0 else 0.0,
+        "moves": moves,
+        "results": {f"{a} vs {b}": {"wins": w, "draws": d, "losses": l} for (a, b), (w, d, l) in table.items()},
+        "elo": elo_ratings(scores, agents),
+    }
+
+
+def print_report(report: Dict):
+    agents = report["agents"]
+    width = max(12, max(len(agent) for agent in agents) + 2)
+    print(f"{report['games']} games in {report['seconds']:.1f}s ({report['games_per_sec']:.1f} games/s)")
+    print("Wins-draws-losses of the row agent against the column agent:")
+    print("".ljust(width) + "".join(agent.rjust(width) for agent in agents))
+    for a in agents:
+        cells = []
+        for b in agents:
+            if a == b:
+                cells.append("-".rjust(width))
+            else:
+                result = report["results"][f"{a} vs {b}"]
+                cells.append(f"{result['wins']}-{result['draws']}-{result['losses']}".rjust(width))
+        print(a.ljust(width) + "".join(cells))
+    print("Elo:")
+    for agent, rating in sorted(report["elo"].items(), key=lambda item: -item[1]):
+        print(f"  {agent.ljust(width)}{rating:7.0f}")
+
+
+if __name__ == "__main__":
+    GameConfig.load()
+
+    parser = argparse.ArgumentParser(description="Play a self-play tournament between AI agents")
+    parser.add_argument("agents", nargs="+",
+                        help=f"AI levels ({', '.join(AI_LEVELS)}), depth-N, mcts, mcts-N or external:<url>")
+    parser.add_argument("--games", type=int, default=100, help="games per pair of agents")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the random moves of all games")
+    parser.add_argument("--random-moves", type=int, default=2, help="random moves at the start of every game")
+    parser.add_argument("--time", type=float, default=GameConfig.ai_time_budget,
+                        help="search time per move in seconds")
+    parser.add_argument("--no-book", action="store_true", help="search levels do not use the opening book")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+    if len(set(args.agents)) < 2:
+        parser.error("at least two different agents are needed")
+    try:
+        for agent in args.agents:
+            check_agent(agent)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = run_tournament(list(dict.fromkeys(args.agents)), args.games, args.workers, args.seed,
+                            args.random_moves, GameConfig.num_rows, GameConfig.num_columns,
+                            GameConfig.connect_length, args.time,
+                            None if args.no_book else GameConfig.opening_book)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)